@@ -0,0 +1,52 @@
+"""
+Cold-start check: measure how long importing the ETL modules takes in a
+fresh interpreter (python -X importtime) and fail if `import etl.run_etl`
+exceeds the budget.
+
+    python -m benchmarks.bench_import_time --budget-ms 300
+"""
+
+import argparse
+import subprocess
+import sys
+
+MODULES = [
+    "etl.run_etl",
+    "etl.extract_inventory",
+    "etl.transform_inventory",
+    "etl.load_inventory",
+    "etl.summary_inventory",
+    "etl.update_uom_with_asin",
+]
+
+
+def import_time_ms(module):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True
+    )
+    # importtime lines: "import time: self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1000
+    raise RuntimeError(f"no importtime entry for {module}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    for module in MODULES:
+        print(f"{module:<28} {import_time_ms(module):>8.1f} ms")
+
+    cold_start = import_time_ms("etl.run_etl")
+    if cold_start > args.budget_ms:
+        print(f"❌ import etl.run_etl took {cold_start:.1f} ms (budget {args.budget_ms:.0f} ms)")
+        sys.exit(1)
+    print(f"✅ import etl.run_etl took {cold_start:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
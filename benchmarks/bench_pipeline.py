@@ -0,0 +1,259 @@
+"""
+End-to-end pipeline benchmark: every stage of run_etl timed separately at
+several inventory sizes, with throughput and how much each stage grew the
+RSS, saved as JSON and compared against a baseline.
+
+    python -m benchmarks.bench_pipeline --skus 1000 10000 100000
+    python -m benchmarks.bench_pipeline --skus 1000 10000 --save-baseline
+    python -m benchmarks.bench_pipeline --skus 1000000 --products 1000
+
+SP-API calls go through the offline replay backend (etl.replay), scaled so
+each run returns at least --skus inventory rows across the EU
+marketplaces, --missing-asin-rate of them without an ASIN so the Listings
+lookups run. The
+Postgres stages write to the database in DB_URL / POSTGRES_*, so point it
+at a scratch database: the snapshot, amazon_inventory and the ASIN cache
+are truncated before every size. The MySQL loaders only run when
+MYSQL_URL or MYSQL_HOST is set; otherwise they are reported as skipped.
+
+Results go to benchmarks/results/pipeline-<timestamp>.json. A stage's memory
+is its RSS growth: the peak while it ran minus the RSS when it started, so
+a stage is not charged for what earlier stages left allocated. The whole
+process's peak RSS is reported once per size. A stage is a regression when
+it is more than --tolerance slower (or grows the RSS more) than the
+baseline for the same size; the exit status is 1 if any is.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+from etl.metrics import MemorySampler, current_rss
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+BASELINE_PATH = os.path.join(RESULTS_DIR, "baseline.json")
+
+
+def timed(results, name, stage, *args, rows=None):
+    """Run stage(*args), record seconds, rows/s and RSS growth under name
+    and return what it returned. rows is the row count or a function of
+    the result giving it (len by default)."""
+    start_rss = current_rss()
+    with MemorySampler(interval=0.01) as rss:
+        start = time.perf_counter()
+        result = stage(*args)
+        seconds = time.perf_counter() - start
+    count = len(result) if rows is None else rows(result) if callable(rows) else rows
+    growth = (rss.peak - start_rss) / 2**20
+    results[name] = {
+        "rows": count,
+        "seconds": round(seconds, 4),
+        "rows_per_s": round(count / seconds, 1) if seconds else None,
+        "rss_growth_mb": round(growth, 1),
+    }
+    results["process"]["peak_rss_mb"] = max(results["process"]["peak_rss_mb"], round(rss.peak / 2**20, 1))
+    print(f"✅ {name}: {count} rows in {seconds:.2f}s ({count / seconds if seconds else 0:,.0f} rows/s), "
+          f"RSS +{growth:.0f} MiB")
+    return result
+
+
+def reset_tables():
+    from sqlalchemy import text
+
+    from etl.db import get_postgres_engine
+
+    with get_postgres_engine().begin() as conn:
+        for table in ("inventory_snapshot", "amazon_inventory", "sku_asin_cache"):
+            conn.execute(text(f"""
+                DO $$ BEGIN
+                    IF to_regclass('amazon_data.{table}') IS NOT NULL THEN
+                        TRUNCATE amazon_data.{table};
+                    END IF;
+                END $$
+            """))
+
+
+def run_size(skus, args):
+    from sp_api.base import Marketplaces
+
+    from etl import extract_inventory, replay
+    from etl.asin_cache import AsinCache
+    from etl.asin_lookup import AsinLookupEngine
+    from etl.extract_orders import _parse_time, fetch_orders
+    from etl.extract_products import fetch_products
+    from etl.load_inventory import insert_inventory_to_db
+    from etl.mock_data import mock_products
+    from etl.summary_inventory import summarize_inventory
+    from etl.transform_inventory import transform_inventory
+    from etl.transform_orders import transform_orders
+    from etl.transform_products import transform_products
+
+    marketplaces = extract_inventory.EU_MARKETPLACES
+    fixture = replay.ReplayDataset(scale=1).inventory("fixture")
+    scale = max(1, math.ceil(skus / (len(fixture) * len(marketplaces))))
+    replay.reset_replay(replay.ReplayDataset(scale=scale))
+    reset_tables()
+    # start every size with an empty ASIN cache so enrichment does lookups
+    extract_inventory.asin_cache = AsinCache()
+
+    print(f"\n📊 {skus} SKUs (replay scale {scale})")
+    results = {"process": {"peak_rss_mb": 0}}
+
+    def extract():
+        pages = {}
+        for country, marketplace in marketplaces.items():
+            pages[country] = [item for page in extract_inventory.iter_inventory_pages(marketplace, country)
+                              for item in page]
+        return pages
+
+    def enrich(pages):
+        engine = AsinLookupEngine()
+        try:
+            for country, items in pages.items():
+                extract_inventory.enrich_inventory_with_asins(marketplaces[country], country, items, engine)
+        finally:
+            engine.shutdown()
+            extract_inventory.asin_cache.flush()
+        return pages
+
+    def count_pages(pages):
+        return sum(len(items) for items in pages.values())
+
+    pages = timed(results, "extract_inventory", extract, rows=count_pages)
+    timed(results, "asin_enrichment", enrich, pages, rows=count_pages)
+    inventory = [item for items in pages.values() for item in items]
+    del pages
+
+    batch_ts = datetime.utcnow()
+    timed(results, "normalize_and_upsert", extract_inventory.normalize_and_upsert, inventory, batch_ts,
+          rows=len(inventory))
+    records = timed(results, "transform_inventory",
+                    lambda inventory: transform_inventory(inventory, as_records=True), inventory)
+    timed(results, "insert_inventory_to_db", insert_inventory_to_db, records, rows=len(records))
+    del records
+    timed(results, "summarize_inventory", summarize_inventory, rows=len(inventory))
+    del inventory
+
+    since = _parse_time(os.getenv("ORDERS_START_DATE", "2024-01-01T00:00:00Z"))
+    orders = timed(results, "extract_orders", lambda: fetch_orders(since=since)[0])
+    orders = timed(results, "transform_orders", lambda: transform_orders(orders, as_records=True))
+    # getListingsItem is one call per SKU, so only a sample is fetched
+    sample = [item["sellerSku"] for item in
+              replay.get_dataset().inventory(Marketplaces.US.marketplace_id)[:min(skus, args.products)]]
+    timed(results, "extract_products", lambda: fetch_products(sample))
+    # fetch_products returns raw listings, which transform_products can't
+    # read yet (see its comment), so the product loaders get mock rows
+    raw_products = [mock_products[i % len(mock_products)] for i in range(skus)]
+    products = timed(results, "transform_products", lambda: transform_products(raw_products, as_records=True))
+
+    if os.getenv("MYSQL_URL") or os.getenv("MYSQL_HOST"):
+        from etl.load_orders import insert_orders_to_db
+        from etl.load_products import insert_products_to_db
+
+        timed(results, "insert_orders_to_db", insert_orders_to_db, orders, rows=len(orders))
+        timed(results, "insert_products_to_db", insert_products_to_db, products, rows=len(products))
+    else:
+        print("⚠️ MYSQL_URL / MYSQL_HOST not set, skipping the MySQL loaders")
+        results["insert_orders_to_db"] = results["insert_products_to_db"] = {"skipped": "no MySQL configured"}
+
+    return results
+
+
+def compare(results, baseline, tolerance, min_seconds, min_rss_mb):
+    """(size, stage, metric, baseline, current) for every regression."""
+    regressions = []
+    for size, stages in results.items():
+        for stage, current in stages.items():
+            before = baseline.get(size, {}).get(stage)
+            if not before or "skipped" in current or "skipped" in before:
+                continue
+            # short stages and small allocations are mostly noise; only flag
+            # them once the absolute difference is meaningful too
+            for metric, floor in (("seconds", min_seconds), ("rss_growth_mb", min_rss_mb),
+                                  ("peak_rss_mb", min_rss_mb)):
+                if metric not in current or metric not in before:
+                    continue
+                if current[metric] > before[metric] * (1 + tolerance) and current[metric] - before[metric] >= floor:
+                    regressions.append((size, stage, metric, before[metric], current[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--skus", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--products", type=int, default=1000,
+                        help="SKUs sent to getListingsItem for the products stages")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0)
+    parser.add_argument("--missing-asin-rate", type=float, default=0.05)
+    parser.add_argument("--rate-scale", type=float, default=1000)
+    parser.add_argument("--output", help="result file (default benchmarks/results/pipeline-<timestamp>.json)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--min-seconds", type=float, default=0.05)
+    parser.add_argument("--min-rss-mb", type=float, default=10)
+    args = parser.parse_args()
+
+    # before the ETL modules read their settings
+    os.environ["SPAPI_TRANSPORT"] = "replay"
+    os.environ["REPLAY_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["REPLAY_THROTTLE_RATE"] = str(args.throttle_rate)
+    os.environ["REPLAY_MISSING_ASIN_RATE"] = str(args.missing_asin_rate)
+    os.environ["SPAPI_RATE_SCALE"] = str(args.rate_scale)
+    os.environ.setdefault("SPAPI_BACKOFF_BASE", "0.01")
+    os.environ.setdefault("SP_API_SELLER_ID", "BENCHMARK")
+
+    from etl.extract_inventory import ensure_snapshot_table
+    from etl.uom import sync_uom_from_excel
+    from etl.update_uom_with_asin import update_uom_with_asin
+
+    ensure_snapshot_table()
+    sync_uom_from_excel()
+    update_uom_with_asin()
+
+    started = datetime.now(timezone.utc)
+    results = {str(skus): run_size(skus, args) for skus in args.skus}
+    report = {
+        "started_at": started.isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "settings": {name: os.getenv(name) for name in (
+            "SNAPSHOT_LOAD_METHOD", "SUMMARY_ENGINE", "SNAPSHOT_BATCH_SIZE",
+            "INVENTORY_INSERT_PAGE_SIZE", "MYSQL_LOAD_CHUNK_SIZE",
+        )},
+        "args": vars(args),
+        "results": results,
+    }
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline-{started:%Y%m%dT%H%M%S}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance, args.min_seconds,
+                                  args.min_rss_mb)
+        for size, stage, metric, before, after in regressions:
+            print(f"❌ {size} SKUs, {stage}: {metric} {before} -> {after}")
+        if not regressions:
+            print(f"✅ No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    else:
+        print(f"⚠️ No baseline at {args.baseline}; run with --save-baseline to create one")
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Baseline saved to {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Memory per 100k rows: the dicts the stages used to pass around versus the
+slots records from etl.records.
+
+    python -m benchmarks.bench_record_memory --rows 100000
+
+Inventory rows come from amazon-fetched/inventory.json, orders and products
+from etl.mock_data, each replicated up to --rows. Sizes are measured with
+tracemalloc; both variants build the same values, so the difference is
+the per-row container.
+"""
+
+import argparse
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.bench_snapshot_load import load_fixture
+from etl import uom
+from etl.extract_inventory import normalize_inventory
+from etl.mock_data import mock_orders, mock_products
+from etl.records import SnapshotRow
+from etl.transform_inventory import transform_inventory
+from etl.transform_orders import transform_orders
+from etl.transform_products import transform_products
+
+
+def replicate(rows, count):
+    return [rows[i % len(rows)] for i in range(count)]
+
+
+def measure(build):
+    tracemalloc.start()
+    rows = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixture", default="amazon-fetched/inventory.json")
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    summaries = load_fixture(args.fixture, 1)
+    inventory = replicate(summaries, args.rows)
+    orders = replicate(mock_orders, args.rows)
+    products = replicate(mock_products, args.rows)
+    uom.UOM_MAP = {}
+    batch_ts = datetime.utcnow()
+    # parse once up front so both variants hold the same value objects
+    snapshot_values = list(normalize_inventory(inventory, batch_ts))
+
+    stages = {
+        "inventory_snapshot": (
+            lambda: [dict(row) for row in snapshot_values],
+            lambda: [SnapshotRow(**row) for row in snapshot_values],
+        ),
+        "amazon_inventory": (
+            lambda: transform_inventory(inventory),
+            lambda: transform_inventory(inventory, as_records=True),
+        ),
+        "amazon_orders": (
+            lambda: transform_orders(orders),
+            lambda: transform_orders(orders, as_records=True),
+        ),
+        "amazon_products": (
+            lambda: transform_products(products),
+            lambda: transform_products(products, as_records=True),
+        ),
+    }
+    per = 100_000 / args.rows
+    for name, (as_dicts, as_records) in stages.items():
+        dict_bytes, rows = measure(as_dicts)
+        del rows
+        record_bytes, rows = measure(as_records)
+        del rows
+        print(
+            f"✅ {name}: dicts {dict_bytes * per / 2**20:.1f} MiB, "
+            f"records {record_bytes * per / 2**20:.1f} MiB per 100k rows "
+            f"({1 - record_bytes / dict_bytes:.0%} less)"
+        )
+
+
+if __name__ == "__main__":
+    main()
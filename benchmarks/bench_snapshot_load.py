@@ -0,0 +1,84 @@
+"""
+Compare inventory_snapshot load throughput: row-wise upsert (executemany)
+versus COPY into a staging table plus one set-based merge.
+
+    python -m benchmarks.bench_snapshot_load --scale 100
+
+Uses the same database settings as the ETL (DB_URL or POSTGRES_*). The
+amazon-fetched/inventory.json payload is replicated --scale times under
+BENCH- SKUs; those rows are deleted again after each method. Every row is
+written whatever SNAPSHOT_WRITE_MODE says, and the delta state is not
+touched.
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+from etl import extract_inventory
+from etl.db import get_postgres_engine
+
+
+def load_fixture(path, scale):
+    with open(path) as f:
+        summaries = json.load(f)["payload"]["inventorySummaries"]
+    items = []
+    for i in range(scale):
+        for summary in summaries:
+            item = dict(summary)
+            item["sellerSku"] = f"BENCH-{i}-{summary['sellerSku']}"
+            item["country"] = "DE"
+            items.append(item)
+    return items
+
+
+def cleanup():
+    with get_postgres_engine().begin() as conn:
+        conn.execute(text("DELETE FROM amazon_data.inventory_snapshot WHERE seller_sku LIKE 'BENCH-%'"))
+
+
+def load(rows, method, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(rows), batch_size):
+        extract_inventory.write_snapshot_rows(rows[i:i + batch_size], method, mode="full")
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixture", default="amazon-fetched/inventory.json")
+    parser.add_argument("--scale", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    extract_inventory.ensure_snapshot_table()
+    items = load_fixture(args.fixture, args.scale)
+    rows = list(extract_inventory.normalize_inventory(items, datetime.utcnow()))
+    print(f"📊 {len(rows)} snapshot rows, batch size {args.batch_size}")
+
+    results = {}
+    for method in ("upsert", "copy"):
+        cleanup()
+        try:
+            # first pass inserts, second pass hits ON CONFLICT for every row
+            inserted = load(rows, method, args.batch_size)
+            updated = load(rows, method, args.batch_size)
+        finally:
+            cleanup()
+        results[method] = {
+            "insert_rows_per_sec": round(len(rows) / inserted),
+            "update_rows_per_sec": round(len(rows) / updated),
+        }
+        print(f"{method:>7}: insert {results[method]['insert_rows_per_sec']:>8} rows/s, "
+              f"update {results[method]['update_rows_per_sec']:>8} rows/s")
+
+    speedup = results["upsert"]["insert_rows_per_sec"] and \
+        results["copy"]["insert_rows_per_sec"] / results["upsert"]["insert_rows_per_sec"]
+    print(f"✅ COPY insert speedup: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+inventory_snapshot_archive: every snapshot row ever loaded, range-partitioned
+by snapshot_date into monthly partitions that are created on demand. An index
+on (seller_sku, snapshot_date DESC) keeps per-SKU history lookups cheap no
+matter how many months are archived.
+
+latest_sku_asin holds the most recent archived ASIN per seller_sku. It is
+updated from each snapshot as it is archived, so readers never have to scan
+the archive to find it.
+
+inventory_daily is the daily rollup behind etl.history: one row per
+(seller_sku, country, snapshot_date) with the latest total quantity
+observed that day, indexed by (asin, country, date). As in the archive, the
+day is the date of the snapshot_timestamp (the item's lastUpdatedTime), so
+a row marks a day the quantity was reported as updated, not a run date. It
+is backfilled from the archive on first use, before the current snapshot
+is archived, and then updated from every archived snapshot.
+"""
+
+from datetime import date
+
+from sqlalchemy import text
+
+ARCHIVE_TABLE = "amazon_data.inventory_snapshot_archive"
+
+ARCHIVE_COLUMNS = [
+    "seller_sku", "country", "snapshot_timestamp", "fulfillable_quantity",
+    "unfulfillable_quantity", "inbound_working_quantity",
+    "inbound_shipped_quantity", "inbound_received_quantity",
+    "reserved_quantity", "total_quantity", "asin",
+]
+
+
+def _relkind(conn, name):
+    return conn.execute(text("""
+        SELECT c.relkind
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'amazon_data' AND c.relname = :name
+    """), {"name": name}).scalar()
+
+
+def _month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def ensure_month_partitions(conn, months):
+    for month in sorted({_month_start(m) for m in months}):
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS amazon_data.inventory_snapshot_archive_y{month:%Y}m{month:%m}
+            PARTITION OF {ARCHIVE_TABLE}
+            FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')
+        """))
+
+
+def ensure_archive_table(conn):
+    """Create the partitioned archive, migrating a pre-existing plain
+    (unpartitioned) archive table into it the first time."""
+    relkind = _relkind(conn, "inventory_snapshot_archive")
+    if relkind == "p":
+        return
+    if relkind == "r":
+        conn.execute(text(f"ALTER TABLE {ARCHIVE_TABLE} RENAME TO inventory_snapshot_archive_legacy"))
+
+    conn.execute(text(f"""
+        CREATE TABLE {ARCHIVE_TABLE} (
+            seller_sku                TEXT          NOT NULL,
+            country                   TEXT          NOT NULL,
+            snapshot_timestamp        TIMESTAMPTZ   NOT NULL,
+            fulfillable_quantity      INTEGER       NOT NULL,
+            unfulfillable_quantity    INTEGER       NOT NULL,
+            inbound_working_quantity  INTEGER       NOT NULL,
+            inbound_shipped_quantity  INTEGER       NOT NULL,
+            inbound_received_quantity INTEGER       NOT NULL,
+            reserved_quantity         INTEGER       NOT NULL,
+            total_quantity            INTEGER       NOT NULL,
+            asin                      TEXT,
+            snapshot_date             DATE          NOT NULL,
+            CONSTRAINT inventory_snapshot_archive_part_pkey
+                PRIMARY KEY (seller_sku, country, snapshot_timestamp, snapshot_date)
+        ) PARTITION BY RANGE (snapshot_date)
+    """))
+    conn.execute(text(f"""
+        CREATE INDEX IF NOT EXISTS inventory_snapshot_archive_sku_date_idx
+        ON {ARCHIVE_TABLE} (seller_sku, snapshot_date DESC)
+    """))
+
+    if relkind == "r":
+        legacy = "amazon_data.inventory_snapshot_archive_legacy"
+        legacy_columns = set(conn.execute(text("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = 'amazon_data' AND table_name = 'inventory_snapshot_archive_legacy'
+        """)).scalars())
+        select_columns = ", ".join(
+            col if col in legacy_columns else f"NULL AS {col}" for col in ARCHIVE_COLUMNS
+        )
+        snapshot_date = (
+            "COALESCE(snapshot_date, snapshot_timestamp::date)"
+            if "snapshot_date" in legacy_columns else "snapshot_timestamp::date"
+        )
+        months = conn.execute(text(
+            f"SELECT DISTINCT date_trunc('month', {snapshot_date})::date FROM {legacy}"
+        )).scalars().all()
+        ensure_month_partitions(conn, months)
+        conn.execute(text(f"""
+            INSERT INTO {ARCHIVE_TABLE} ({", ".join(ARCHIVE_COLUMNS)}, snapshot_date)
+            SELECT {select_columns}, {snapshot_date}
+            FROM {legacy}
+            ON CONFLICT DO NOTHING
+        """))
+        conn.execute(text(f"DROP TABLE {legacy}"))
+        print(f"✅ Migrated existing archive into monthly partitions ({len(months)} months)")
+
+
+def archive_snapshot(conn, source="amazon_data.inventory_snapshot"):
+    """Move the current inventory_snapshot into the archive in one
+    set-based statement; Postgres routes each day to its month partition.
+    source is the run's complete latest state for the daily rollup (see
+    summary_inventory.snapshot_source)."""
+    ensure_archive_table(conn)
+    # backfills run first, so they only see earlier snapshots
+    ensure_latest_sku_asin(conn)
+    ensure_daily_rollup(conn)
+    months = conn.execute(text(
+        "SELECT DISTINCT date_trunc('month', snapshot_timestamp::date)::date FROM amazon_data.inventory_snapshot"
+    )).scalars().all()
+    ensure_month_partitions(conn, months)
+    columns = ", ".join(ARCHIVE_COLUMNS)
+    conn.execute(text(f"""
+        INSERT INTO {ARCHIVE_TABLE} ({columns}, snapshot_date)
+        SELECT {columns}, snapshot_timestamp::date
+        FROM amazon_data.inventory_snapshot
+        ON CONFLICT (seller_sku, country, snapshot_timestamp, snapshot_date) DO NOTHING
+    """))
+    update_latest_sku_asin(conn)
+    update_daily_rollup(conn, source)
+
+
+def ensure_latest_sku_asin(conn):
+    """Create latest_sku_asin, backfilling it from the archive on first use."""
+    exists = _relkind(conn, "latest_sku_asin") is not None
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS amazon_data.latest_sku_asin (
+            seller_sku          TEXT          PRIMARY KEY,
+            asin                TEXT,
+            snapshot_date       DATE          NOT NULL,
+            snapshot_timestamp  TIMESTAMPTZ   NOT NULL
+        )
+    """))
+    if exists:
+        return
+    ensure_archive_table(conn)
+    conn.execute(text(f"""
+        INSERT INTO amazon_data.latest_sku_asin (seller_sku, asin, snapshot_date, snapshot_timestamp)
+        SELECT DISTINCT ON (seller_sku) seller_sku, asin, snapshot_date, snapshot_timestamp
+        FROM {ARCHIVE_TABLE}
+        ORDER BY seller_sku, snapshot_date DESC, snapshot_timestamp DESC
+    """))
+
+
+def update_latest_sku_asin(conn):
+    # Only the SKUs in the current snapshot can change; rows archived earlier
+    # never overwrite a newer entry.
+    conn.execute(text("""
+        INSERT INTO amazon_data.latest_sku_asin AS l (seller_sku, asin, snapshot_date, snapshot_timestamp)
+        SELECT DISTINCT ON (seller_sku) seller_sku, asin, snapshot_timestamp::date AS snapshot_date, snapshot_timestamp
+        FROM amazon_data.inventory_snapshot
+        ORDER BY seller_sku, snapshot_timestamp DESC
+        ON CONFLICT (seller_sku) DO UPDATE SET
+            asin = EXCLUDED.asin,
+            snapshot_date = EXCLUDED.snapshot_date,
+            snapshot_timestamp = EXCLUDED.snapshot_timestamp
+        WHERE (EXCLUDED.snapshot_date, EXCLUDED.snapshot_timestamp)
+              >= (l.snapshot_date, l.snapshot_timestamp)
+    """))
+
+
+def ensure_daily_rollup(conn):
+    """Create inventory_daily, backfilling it from the archive on first use."""
+    exists = _relkind(conn, "inventory_daily") is not None
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS amazon_data.inventory_daily (
+            seller_sku          TEXT          NOT NULL,
+            country             TEXT          NOT NULL,
+            snapshot_date       DATE          NOT NULL,
+            asin                TEXT,
+            total_quantity      INTEGER       NOT NULL,
+            snapshot_timestamp  TIMESTAMPTZ   NOT NULL,
+            PRIMARY KEY (seller_sku, country, snapshot_date)
+        );
+        CREATE INDEX IF NOT EXISTS inventory_daily_asin_country_date_idx
+        ON amazon_data.inventory_daily (asin, country, snapshot_date) INCLUDE (seller_sku, total_quantity);
+    """))
+    if exists:
+        return
+    ensure_archive_table(conn)
+    conn.execute(text(f"""
+        INSERT INTO amazon_data.inventory_daily
+            (seller_sku, country, snapshot_date, asin, total_quantity, snapshot_timestamp)
+        SELECT DISTINCT ON (a.seller_sku, a.country, a.snapshot_date)
+               a.seller_sku, a.country, a.snapshot_date, COALESCE(a.asin, l.asin),
+               a.total_quantity, a.snapshot_timestamp
+        FROM {ARCHIVE_TABLE} a
+        LEFT JOIN amazon_data.latest_sku_asin l ON l.seller_sku = a.seller_sku
+        ORDER BY a.seller_sku, a.country, a.snapshot_date, a.snapshot_timestamp DESC
+    """))
+
+
+def update_daily_rollup(conn, source="amazon_data.inventory_snapshot"):
+    # Same rows the backfill builds from the archive: the latest observation
+    # per SKU, country and snapshot date, never replaced by an older one.
+    # Unchanged SKUs in delta mode rewrite their old row as is. SKUs without
+    # an ASIN take the latest known one.
+    conn.execute(text(f"""
+        INSERT INTO amazon_data.inventory_daily AS d
+            (seller_sku, country, snapshot_date, asin, total_quantity, snapshot_timestamp)
+        SELECT DISTINCT ON (s.seller_sku, s.country, s.snapshot_timestamp::date)
+               s.seller_sku, s.country, s.snapshot_timestamp::date, COALESCE(s.asin, l.asin),
+               s.total_quantity, s.snapshot_timestamp
+        FROM (SELECT * FROM {source}) s
+        LEFT JOIN amazon_data.latest_sku_asin l ON l.seller_sku = s.seller_sku
+        ORDER BY s.seller_sku, s.country, s.snapshot_timestamp::date, s.snapshot_timestamp DESC
+        ON CONFLICT (seller_sku, country, snapshot_date) DO UPDATE SET
+            asin = EXCLUDED.asin,
+            total_quantity = EXCLUDED.total_quantity,
+            snapshot_timestamp = EXCLUDED.snapshot_timestamp
+        WHERE EXCLUDED.snapshot_timestamp >= d.snapshot_timestamp
+    """))
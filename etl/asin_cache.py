@@ -0,0 +1,111 @@
+"""
+Persistent SKU -> ASIN lookup cache for the inventory enrichment step.
+Entries are keyed by (seller_sku, country) and live in
+amazon_data.sku_asin_cache. The whole table is read once per run; new
+lookups are buffered and written back in one batch by flush().
+Failed lookups are cached too (asin NULL) with a shorter TTL.
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from etl.db import get_postgres_engine
+
+
+class AsinCache:
+    def __init__(self, engine=None, ttl_days=None, negative_ttl_hours=None):
+        if ttl_days is None:
+            ttl_days = float(os.getenv("ASIN_CACHE_TTL_DAYS", 30))
+        if negative_ttl_hours is None:
+            negative_ttl_hours = float(os.getenv("ASIN_CACHE_NEGATIVE_TTL_HOURS", 24))
+        self.engine = engine
+        self.ttl = timedelta(days=ttl_days)
+        self.negative_ttl = timedelta(hours=negative_ttl_hours)
+        self.hits = 0
+        self.misses = 0
+        self._entries = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        with (self.engine or get_postgres_engine()).begin() as conn:
+            conn.execute(text("""
+                CREATE SCHEMA IF NOT EXISTS amazon_data;
+                CREATE TABLE IF NOT EXISTS amazon_data.sku_asin_cache (
+                    seller_sku    TEXT          NOT NULL,
+                    country       TEXT          NOT NULL,
+                    asin          TEXT,
+                    looked_up_at  TIMESTAMPTZ   NOT NULL,
+                    PRIMARY KEY (seller_sku, country)
+                );
+            """))
+            result = conn.execute(text(
+                "SELECT seller_sku, country, asin, looked_up_at FROM amazon_data.sku_asin_cache"
+            )).mappings().all()
+        self._entries = {
+            (row['seller_sku'], row['country']): (row['asin'], row['looked_up_at'])
+            for row in result
+        }
+        print(f"🗂️ Loaded {len(self._entries)} cached SKU→ASIN entries")
+
+    def _ensure_loaded(self):
+        if self._entries is None:
+            self.load()
+
+    def lookup(self, seller_sku, country):
+        """Return (hit, asin); asin is None for a cached failed lookup."""
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get((seller_sku, country))
+            if entry is not None:
+                asin, looked_up_at = entry
+                ttl = self.ttl if asin else self.negative_ttl
+                if datetime.now(timezone.utc) - looked_up_at < ttl:
+                    self.hits += 1
+                    return True, asin
+            self.misses += 1
+            return False, None
+
+    def store(self, seller_sku, country, asin):
+        with self._lock:
+            self._ensure_loaded()
+            key = (seller_sku, country)
+            entry = self._entries.get(key)
+            # ASINs that came with the inventory summary don't need rewriting
+            # every run as long as the cached value is still fresh.
+            if entry is not None and entry[0] == asin and asin and \
+                    datetime.now(timezone.utc) - entry[1] < self.ttl / 2:
+                return
+            self._entries[key] = self._pending[key] = (asin, datetime.now(timezone.utc))
+
+    def flush(self):
+        with self._lock:
+            rows = [
+                {"seller_sku": sku, "country": country, "asin": asin, "looked_up_at": ts}
+                for (sku, country), (asin, ts) in self._pending.items()
+            ]
+            self._pending = {}
+        if not rows:
+            return
+        with (self.engine or get_postgres_engine()).begin() as conn:
+            conn.execute(text("""
+                INSERT INTO amazon_data.sku_asin_cache (seller_sku, country, asin, looked_up_at)
+                VALUES (:seller_sku, :country, :asin, :looked_up_at)
+                ON CONFLICT (seller_sku, country) DO UPDATE SET
+                    asin = EXCLUDED.asin,
+                    looked_up_at = EXCLUDED.looked_up_at
+            """), rows)
+
+    def reset_stats(self):
+        # hits/misses are reported per run; the entries stay loaded
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def report(self):
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0
+        print(f"🗂️ ASIN cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate)")
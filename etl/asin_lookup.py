@@ -0,0 +1,82 @@
+"""
+Bounded-concurrency getListingsItem lookups for SKUs missing from the ASIN
+cache. Each SKU is looked up once per run and marketplace. Requests for a
+SKU from other marketplaces reuse the first lookup's ASIN when it found one;
+when it failed (e.g. NOT_FOUND, as the SKU is not listed there) they look
+the SKU up in their own marketplace instead of inheriting the failure. A
+throttled first lookup is not retried elsewhere.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from etl.rate_limit import call_with_backoff, is_throttled
+from etl.transport import listings_client, session_key
+
+
+class AsinLookupEngine:
+    def __init__(self, max_workers=None):
+        if max_workers is None:
+            max_workers = int(os.getenv("ASIN_LOOKUP_WORKERS", 4))
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="asin-lookup")
+        # (seller_sku, marketplace_id) -> future, and the first future per SKU
+        self._inflight = {}
+        self._first = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def submit(self, marketplace, seller_sku):
+        with self._lock:
+            key = (seller_sku, marketplace.marketplace_id)
+            future = self._inflight.get(key)
+            if future is None:
+                first = self._first.get(seller_sku)
+                if first is None:
+                    future = self._first[seller_sku] = self._pool.submit(self._lookup, marketplace, seller_sku)
+                else:
+                    # first was queued earlier, so it is running or done by
+                    # the time a worker picks this up
+                    future = self._pool.submit(self._lookup_after, first, marketplace, seller_sku)
+                self._inflight[key] = future
+            return future
+
+    def _lookup_after(self, first, marketplace, seller_sku):
+        try:
+            asin = first.result()
+        except Exception as e:
+            if is_throttled(e):
+                raise
+            asin = None
+        return asin or self._lookup(marketplace, seller_sku)
+
+    def _client(self, marketplace):
+        # sp_api clients aren't shared between threads; each worker keeps
+        # one per marketplace and rebuilds it when the credentials rotate.
+        session = session_key()
+        clients = getattr(self._local, "clients", None)
+        if clients is None:
+            clients = self._local.clients = {}
+        key = marketplace.marketplace_id
+        cached = clients.get(key)
+        if cached is None or cached[0] != session:
+            cached = clients[key] = (session, listings_client(marketplace))
+        return cached[1]
+
+    def _lookup(self, marketplace, seller_sku):
+        response = call_with_backoff(
+            "getListingsItem",
+            self._client(marketplace).get_listings_item,
+            sellerId=os.getenv("SP_API_SELLER_ID"),
+            sku=seller_sku,
+            marketplaceIds=[marketplace.marketplace_id],
+            includedData=["summaries"],
+        )
+        # the ASIN is reported per marketplace in the listing's summaries
+        for summary in response.payload.get("summaries") or []:
+            if summary.get("marketplaceId") == marketplace.marketplace_id and summary.get("asin"):
+                return summary["asin"]
+        return response.payload.get("asin")
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,154 @@
+"""
+Resumable inventory runs. Every run of run_daily_inventory_report gets a
+row in amazon_data.inventory_runs with its snapshot batch timestamp, and
+every marketplace a row in amazon_data.inventory_checkpoint with the
+nextToken of the next page to fetch, the pages and items already flushed
+to inventory_snapshot and whether it has been read to the end. A run is
+marked extracted once every marketplace has been read, and finished in the
+same transaction that truncates inventory_snapshot after the summary has
+been published, so a rerun after a failed summary rebuilds it from the
+snapshot instead of fetching again.
+
+A checkpoint is only advanced after a page has been loaded, so a rerun
+that resumes from it never skips data; at worst the last page is loaded
+twice, which the snapshot upsert absorbs. An unfinished run is resumed for
+INVENTORY_RESUME_MAX_AGE_HOURS (0 disables resuming); after that a fresh
+run starts.
+"""
+
+import os
+from datetime import datetime
+
+from sqlalchemy import text
+
+from etl.db import get_postgres_engine
+
+
+def ensure_checkpoint_tables(conn):
+    conn.execute(text("""
+        CREATE SCHEMA IF NOT EXISTS amazon_data;
+        CREATE TABLE IF NOT EXISTS amazon_data.inventory_runs (
+            run_id       BIGSERIAL     PRIMARY KEY,
+            batch_ts     TIMESTAMP     NOT NULL,
+            started_at   TIMESTAMPTZ   NOT NULL DEFAULT now(),
+            extracted_at TIMESTAMPTZ,
+            finished_at  TIMESTAMPTZ
+        );
+        ALTER TABLE amazon_data.inventory_runs ADD COLUMN IF NOT EXISTS extracted_at TIMESTAMPTZ;
+        CREATE TABLE IF NOT EXISTS amazon_data.inventory_checkpoint (
+            run_id       BIGINT        NOT NULL REFERENCES amazon_data.inventory_runs ON DELETE CASCADE,
+            country      TEXT          NOT NULL,
+            next_token   TEXT,
+            pages        INTEGER       NOT NULL DEFAULT 0,
+            items        INTEGER       NOT NULL DEFAULT 0,
+            completed    BOOLEAN       NOT NULL DEFAULT false,
+            updated_at   TIMESTAMPTZ   NOT NULL DEFAULT now(),
+            PRIMARY KEY (run_id, country)
+        );
+    """))
+
+
+class InventoryCheckpoint:
+    def __init__(self, run_id, batch_ts, progress=None, resumed=False, extracted=False):
+        self.run_id = run_id
+        self.batch_ts = batch_ts
+        self.resumed = resumed
+        self.extracted = extracted
+        # country -> {"next_token", "pages", "items", "completed"}
+        self.progress = progress or {}
+
+    @classmethod
+    def open(cls, max_age_hours=None):
+        """Resume the latest unfinished run if it is recent enough,
+        otherwise start a new one."""
+        if max_age_hours is None:
+            max_age_hours = float(os.getenv("INVENTORY_RESUME_MAX_AGE_HOURS", 20))
+        with get_postgres_engine().begin() as conn:
+            ensure_checkpoint_tables(conn)
+            run = None
+            if max_age_hours > 0:
+                run = conn.execute(text("""
+                    SELECT run_id, batch_ts, extracted_at FROM amazon_data.inventory_runs
+                    WHERE finished_at IS NULL
+                      AND started_at > now() - make_interval(secs => :max_age)
+                    ORDER BY run_id DESC
+                    LIMIT 1
+                """), {"max_age": max_age_hours * 3600}).first()
+            if run is None:
+                batch_ts = datetime.utcnow()
+                run_id = conn.execute(text(
+                    "INSERT INTO amazon_data.inventory_runs (batch_ts) VALUES (:batch_ts) RETURNING run_id"
+                ), {"batch_ts": batch_ts}).scalar_one()
+                return cls(run_id, batch_ts)
+            rows = conn.execute(text("""
+                SELECT country, next_token, pages, items, completed
+                FROM amazon_data.inventory_checkpoint WHERE run_id = :run_id
+            """), {"run_id": run.run_id}).mappings().all()
+        progress = {row["country"]: dict(row) for row in rows}
+        done = sorted(country for country, state in progress.items() if state["completed"])
+        if run.extracted_at is not None:
+            print(f"♻️ Resuming inventory run {run.run_id} from {run.batch_ts:%Y-%m-%d %H:%M} "
+                  f"(extracted, summary not published yet)")
+        else:
+            print(f"♻️ Resuming inventory run {run.run_id} from {run.batch_ts:%Y-%m-%d %H:%M} "
+                  f"({len(done)} marketplaces complete: {', '.join(done) or 'none'})")
+        return cls(run.run_id, run.batch_ts, progress, resumed=True, extracted=run.extracted_at is not None)
+
+    def is_complete(self, country):
+        return self.progress.get(country, {}).get("completed", False)
+
+    def next_token(self, country):
+        return self.progress.get(country, {}).get("next_token")
+
+    def page_done(self, country, next_token, items):
+        """Record a loaded page; next_token None means the marketplace has
+        been read to the end."""
+        state = self.progress.setdefault(country, {"pages": 0, "items": 0})
+        state.update(
+            next_token=next_token,
+            pages=state["pages"] + 1,
+            items=state["items"] + items,
+            completed=next_token is None,
+        )
+        with get_postgres_engine().begin() as conn:
+            conn.execute(text("""
+                INSERT INTO amazon_data.inventory_checkpoint
+                    (run_id, country, next_token, pages, items, completed)
+                VALUES (:run_id, :country, :next_token, :pages, :items, :completed)
+                ON CONFLICT (run_id, country) DO UPDATE SET
+                    next_token = EXCLUDED.next_token,
+                    pages = EXCLUDED.pages,
+                    items = EXCLUDED.items,
+                    completed = EXCLUDED.completed,
+                    updated_at = now()
+            """), dict(state, run_id=self.run_id, country=country))
+
+    def restart(self, country):
+        """Forget a marketplace's progress, e.g. when its saved nextToken
+        has expired; its pages are fetched again from the start."""
+        self.progress.pop(country, None)
+        with get_postgres_engine().begin() as conn:
+            conn.execute(text("""
+                DELETE FROM amazon_data.inventory_checkpoint
+                WHERE run_id = :run_id AND country = :country
+            """), {"run_id": self.run_id, "country": country})
+
+    def extraction_done(self):
+        """Mark every marketplace as read; a rerun then goes straight to
+        the summary."""
+        self.extracted = True
+        with get_postgres_engine().begin() as conn:
+            conn.execute(text("""
+                UPDATE amazon_data.inventory_runs SET extracted_at = coalesce(extracted_at, now())
+                WHERE run_id = :run_id
+            """), {"run_id": self.run_id})
+
+    def finish(self, conn=None):
+        """Mark the run done, so the next run starts afresh. Pass conn to
+        do it in the transaction that resets inventory_snapshot."""
+        if conn is None:
+            with get_postgres_engine().begin() as conn:
+                return self.finish(conn)
+        conn.execute(text("""
+            UPDATE amazon_data.inventory_runs SET finished_at = now() WHERE run_id = :run_id
+        """), {"run_id": self.run_id})
@@ -0,0 +1,104 @@
+"""
+Shared SP-API credentials. The STS role credentials are assumed once and
+reused by every Inventories/ListingsItems/Orders client until shortly before
+they expire; a background timer refreshes them ahead of time so API calls
+rarely wait on STS. LWA access tokens are cached by sp_api itself.
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import boto3
+from dotenv import load_dotenv
+
+from etl import metrics
+
+load_dotenv()
+
+
+class SPAPICredentialProvider:
+    def __init__(self, refresh_margin=None):
+        if refresh_margin is None:
+            refresh_margin = int(os.getenv("SPAPI_CREDENTIALS_REFRESH_MARGIN", 300))
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self._lock = threading.Lock()
+        self._sts = None
+        self._credentials = None
+        self._expiration = None
+        self._timer = None
+
+    def get_credentials(self):
+        with self._lock:
+            if self._needs_refresh():
+                self._refresh()
+            return dict(self._credentials)
+
+    def _needs_refresh(self):
+        if self._credentials is None:
+            return True
+        return datetime.now(timezone.utc) >= self._expiration - self.refresh_margin
+
+    def _refresh(self):
+        if self._sts is None:
+            self._sts = boto3.client(
+                'sts',
+                aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+                region_name='us-east-1'
+            )
+        metrics.count("sts_calls")
+        with metrics.timer("sts_assume_role"):
+            response = self._sts.assume_role(
+                RoleArn=os.getenv("SPAPI_ROLE_ARN"),
+                RoleSessionName="SPAPISession"
+            )
+        creds = response['Credentials']
+        self._credentials = {
+            "refresh_token": os.getenv("SPAPI_REFRESH_TOKEN"),
+            "lwa_app_id": os.getenv("SPAPI_CLIENT_ID"),
+            "lwa_client_secret": os.getenv("SPAPI_CLIENT_SECRET"),
+            "aws_access_key": creds["AccessKeyId"],
+            "aws_secret_key": creds["SecretAccessKey"],
+            "role_arn": os.getenv("SPAPI_ROLE_ARN"),
+            "session_token": creds["SessionToken"],
+        }
+        self._expiration = creds["Expiration"]
+        self._schedule_background_refresh()
+
+    def _schedule_background_refresh(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        # Refresh one margin earlier than callers would, so the foreground
+        # path only hits STS if the background refresh failed.
+        delay = (self._expiration - 2 * self.refresh_margin - datetime.now(timezone.utc)).total_seconds()
+        if delay <= 0:
+            self._timer = None
+            return
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        try:
+            with self._lock:
+                self._refresh()
+        except Exception as e:
+            print(f"⚠️ Background SP-API credential refresh failed: {e}")
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_credential_provider():
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = SPAPICredentialProvider()
+        return _provider
+
+
+# --- AWS STS temporary credentials for SP-API authentication ---
+def get_spapi_credentials():
+    return get_credential_provider().get_credentials()
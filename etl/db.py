@@ -0,0 +1,117 @@
+"""
+Shared database engines for the ETL steps. Each engine is created on first
+use and then reused, so a whole pipeline run draws from one small
+connection pool per database instead of connecting once per step.
+"""
+
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from sqlalchemy.engine import URL
+
+load_dotenv()
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def postgres_url():
+    # Build the database URL from environment variables if DB_URL is not provided
+    db_url = os.getenv("DB_URL")
+    if not db_url:
+        db_url = (
+            f"postgresql://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@"
+            f"{os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/"
+            f"{os.getenv('POSTGRES_DB')}?sslmode={os.getenv('POSTGRES_SSLMODE', 'require')}"
+        )
+    return db_url
+
+
+def mysql_url():
+    if os.getenv("MYSQL_URL"):
+        return os.getenv("MYSQL_URL")
+    return URL.create(
+        "mysql+pymysql",
+        username=os.getenv("MYSQL_USER"),
+        password=os.getenv("MYSQL_PASSWORD"),
+        host=os.getenv("MYSQL_HOST"),
+        port=int(os.getenv("MYSQL_PORT", 3306)),
+        database=os.getenv("MYSQL_DB"),
+    )
+
+
+def _pool_options():
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 5)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": True,
+    }
+
+
+def _get_engine(name, factory):
+    with _engines_lock:
+        engine = _engines.get(name)
+        if engine is None:
+            engine = _engines[name] = factory()
+        return engine
+
+
+def get_postgres_engine():
+    def build():
+        connect_args = {}
+        timeout_ms = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0))
+        if timeout_ms:
+            connect_args["options"] = f"-c statement_timeout={timeout_ms}"
+        return create_engine(postgres_url(), connect_args=connect_args, **_pool_options())
+    return _get_engine("postgres", build)
+
+
+def get_mysql_engine():
+    def build():
+        connect_args = {}
+        timeout_ms = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0))
+        if timeout_ms:
+            connect_args["init_command"] = f"SET SESSION MAX_EXECUTION_TIME={timeout_ms}"
+        return create_engine(mysql_url(), connect_args=connect_args, **_pool_options())
+    return _get_engine("mysql", build)
+
+
+def dispose_engines():
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+
+def load_mysql_rows(sql, rows, chunk_size=None):
+    """executemany sql over rows (tuples) in chunks, committing after each.
+
+    PyMySQL rewrites an INSERT ... VALUES (%s, ...) executemany into
+    multi-row INSERT statements, so each chunk is a handful of round trips
+    rather than one per row. Chunks committed before a failure stay loaded.
+    Returns (rows loaded, seconds)."""
+    if chunk_size is None:
+        chunk_size = int(os.getenv("MYSQL_LOAD_CHUNK_SIZE", 1000))
+    start = time.perf_counter()
+    loaded = 0
+    # pooled pymysql connection; close() returns it to the pool
+    conn = get_mysql_engine().raw_connection()
+    try:
+        cursor = conn.cursor()
+        for offset in range(0, len(rows), chunk_size):
+            chunk = rows[offset:offset + chunk_size]
+            try:
+                cursor.executemany(sql, chunk)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            loaded += len(chunk)
+        cursor.close()
+    finally:
+        conn.close()
+    return loaded, time.perf_counter() - start
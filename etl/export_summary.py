@@ -0,0 +1,117 @@
+"""
+Writes the daily inventory summary out: amazon_data.inventory_summary in
+Postgres, exports/inventory_summary_<date>.csv and a compressed
+exports/inventory_summary_<date>.parquet next to the CSV (written with
+pyarrow; SUMMARY_PARQUET=0 turns it off).
+
+The rows are COPYed into a temporary table, then swapped into
+inventory_summary with TRUNCATE and INSERT in one transaction, so readers
+see either yesterday's summary or today's, never a missing or empty table.
+The table itself stays in place, so views on it keep working. Only when
+the summary's columns change is the table replaced instead, which fails
+(and publishes nothing) while views still depend on it.
+"""
+
+import io
+import os
+from datetime import date
+
+from pandas.api.types import is_bool_dtype, is_float_dtype, is_integer_dtype
+
+from etl import metrics
+from etl.db import get_postgres_engine
+
+SUMMARY_TABLE = "inventory_summary"
+SCHEMA = "amazon_data"
+
+
+def _column_types(frame):
+    types = []
+    for column, dtype in frame.dtypes.items():
+        if is_bool_dtype(dtype):
+            sql_type = "BOOLEAN"
+        elif is_integer_dtype(dtype):
+            sql_type = "BIGINT"
+        elif is_float_dtype(dtype):
+            sql_type = "DOUBLE PRECISION"
+        else:
+            sql_type = "TEXT"
+        types.append(f'"{column}" {sql_type}')
+    return types
+
+
+def _current_columns(conn, table, schema):
+    return [f'"{name}" {data_type.upper()}' for name, data_type in conn.exec_driver_sql("""
+        SELECT column_name, data_type FROM information_schema.columns
+        WHERE table_schema = %s AND table_name = %s
+        ORDER BY ordinal_position
+    """, (schema, table)).all()]
+
+
+def replace_table(frame, table=SUMMARY_TABLE, schema=SCHEMA, engine=None):
+    """Replace the rows of schema.table with frame: COPY into a temp table,
+    then TRUNCATE and INSERT in one transaction. The table is (re)created
+    when it is missing or its columns differ from frame's."""
+    staging = f"{table}_staging"
+    # \N marks NULL, so empty strings (e.g. the '' ASIN of unknown SKUs)
+    # stay empty strings
+    buf = io.StringIO()
+    frame.to_csv(buf, index=False, header=False, na_rep="\\N")
+    metrics.count("bytes", buf.tell(), stage="inventory_summary_copy")
+    buf.seek(0)
+    columns = ", ".join(f'"{column}"' for column in frame.columns)
+    column_types = _column_types(frame)
+    column_defs = ", ".join(column_types)
+
+    with (engine or get_postgres_engine()).begin() as conn:
+        conn.exec_driver_sql(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+        conn.exec_driver_sql(f"CREATE TEMP TABLE {staging} ({column_defs}) ON COMMIT DROP")
+        cursor = conn.connection.cursor()
+        cursor.copy_expert(f"COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf)
+        cursor.close()
+        current = _current_columns(conn, table, schema)
+        if current != column_types:
+            if current:
+                print(f"⚠️ {schema}.{table} columns changed, recreating it")
+            conn.exec_driver_sql(f"DROP TABLE IF EXISTS {schema}.{table}")
+            conn.exec_driver_sql(f"CREATE TABLE {schema}.{table} ({column_defs})")
+        else:
+            # readers wait on the lock and then see the new rows
+            conn.exec_driver_sql(f"TRUNCATE {schema}.{table}")
+        conn.exec_driver_sql(f"INSERT INTO {schema}.{table} ({columns}) SELECT {columns} FROM {staging}")
+
+
+def write_parquet(frame, path, compression=None):
+    """Write frame as Parquet; returns False, with a warning, when pyarrow
+    is missing from the environment."""
+    if compression is None:
+        compression = os.getenv("SUMMARY_PARQUET_COMPRESSION", "zstd")
+    try:
+        frame.to_parquet(path, index=False, compression=compression)
+    except ImportError:
+        print("⚠️ pyarrow is not installed, skipping the Parquet export")
+        return False
+    return True
+
+
+def export_summary(summary, export_date=None, export_dir="exports", engine=None):
+    """Write the summary to the DB table, the CSV and the Parquet file.
+    Returns the paths of the files written."""
+    with metrics.timer("summary", step="write_db"):
+        replace_table(summary, engine=engine)
+
+    day = (export_date or date.today()).isoformat()
+    os.makedirs(export_dir, exist_ok=True)
+    base = os.path.join(export_dir, f"inventory_summary_{day}")
+    paths = [f"{base}.csv"]
+    with metrics.timer("summary", step="write_csv"):
+        summary.to_csv(paths[0], index=False)
+    metrics.count("bytes", os.path.getsize(paths[0]), stage="inventory_summary_csv")
+
+    if os.getenv("SUMMARY_PARQUET", "1") != "0":
+        with metrics.timer("summary", step="write_parquet"):
+            written = write_parquet(summary, f"{base}.parquet")
+        if written:
+            paths.append(f"{base}.parquet")
+            metrics.count("bytes", os.path.getsize(paths[-1]), stage="inventory_summary_parquet")
+    return paths
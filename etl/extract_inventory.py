@@ -3,83 +3,57 @@ This script fetches full Amazon FBA inventory data from SP-API for multiple EU m
 It collects detailed inventory metrics per SKU and prints a daily summary.
 """
 
+import csv
+import io
 import os
 from dotenv import load_dotenv
 load_dotenv()
-import boto3
-from sp_api.api import Inventories
-from sp_api.api import ListingsItems
 from sp_api.base import SellingApiException, Marketplaces
+from sp_api.base.exceptions import SellingApiBadRequestException
 
+import itertools
+import queue
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
-# --- Database and UOM map setup ---
-from sqlalchemy import create_engine, text
-import pandas as pd
+from etl import metrics
+from etl.asin_cache import AsinCache
+from etl.asin_lookup import AsinLookupEngine
+from etl.db import get_postgres_engine
+from etl.rate_limit import call_with_backoff
+from etl.records import SnapshotRow, row_dict, row_values
+from etl.transport import inventories_client
+from etl.uom import get_uom_map
+
+from sqlalchemy import text
+
+# Persistent SKU→ASIN lookups, read from amazon_data.sku_asin_cache on first use
+asin_cache = AsinCache()
 
-# Build the database URL from environment variables if DB_URL is not provided
-db_url = os.getenv("DB_URL")
-if not db_url:
-    db_url = (
-        f"postgresql://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@"
-        f"{os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/"
-        f"{os.getenv('POSTGRES_DB')}?sslmode=require"
-    )
-engine = create_engine(db_url)
 
 # --- Ensure staging table exists ---
-with engine.begin() as conn:
-    conn.execute(text("""
-        CREATE SCHEMA IF NOT EXISTS amazon_data;
-        CREATE TABLE IF NOT EXISTS amazon_data.inventory_snapshot (
-            seller_sku                TEXT          NOT NULL,
-            country                   TEXT          NOT NULL,
-            snapshot_timestamp        TIMESTAMPTZ   NOT NULL,
-            fulfillable_quantity      INTEGER       NOT NULL,
-            unfulfillable_quantity    INTEGER       NOT NULL,
-            inbound_working_quantity  INTEGER       NOT NULL,
-            inbound_shipped_quantity  INTEGER       NOT NULL,
-            inbound_received_quantity INTEGER       NOT NULL,
-            reserved_quantity         INTEGER       NOT NULL,
-            total_quantity            INTEGER       NOT NULL,
-            PRIMARY KEY (seller_sku, country, snapshot_timestamp)
-        );
-    """))
-
- # --- Load UOM factors from Excel into product_uom table ---
-excel_path = os.getenv('UOM_EXCEL_PATH', 'assets/Produktliste.xlsx')
-# Inspect available sheets
-xls = pd.ExcelFile(excel_path)
-print("Available sheets in UOM file:", xls.sheet_names)
-# Choose the correct sheet (replace 'YourSheetName' with the actual name)
-sheet_name = os.getenv('UOM_SHEET_NAME', xls.sheet_names[0])
-df_uom = pd.read_excel(excel_path, sheet_name=sheet_name)
-# Clean up headers and drop blank rows
-df_uom.columns = df_uom.columns.str.strip()
-# ensure asin column exists even if missing from CSV
-if "asin" not in df_uom.columns:
-    df_uom["asin"] = None
-df_uom = df_uom.rename(columns={'ASIN': 'master_sku', 'SKU': 'seller_sku', 'Einheiten': 'uom_factor'})
-df_uom = df_uom[['master_sku', 'seller_sku', 'uom_factor']].dropna(subset=['master_sku', 'seller_sku'])
-df_uom['uom_factor'] = pd.to_numeric(df_uom['uom_factor'], errors='coerce').fillna(1)
-records = df_uom.to_dict(orient='records')
-with engine.begin() as conn:
-    conn.execute(text("""
-        INSERT INTO amazon_data.product_uom (master_sku, seller_sku, uom_factor)
-        VALUES (:master_sku, :seller_sku, :uom_factor)
-        ON CONFLICT (master_sku, seller_sku) DO UPDATE SET
-          uom_factor = EXCLUDED.uom_factor
-    """), records)
-
-# Load UOM factors into memory: keys are (asin, seller_sku)
-with engine.connect() as conn:
-    result = conn.execute(text(
-        "SELECT master_sku, seller_sku, uom_factor FROM amazon_data.product_uom"
-    )).mappings().all()
-    UOM_MAP = {
-        (row['master_sku'], row['seller_sku']): row['uom_factor']
-        for row in result
-    }
+def ensure_snapshot_table():
+    with get_postgres_engine().begin() as conn:
+        conn.execute(text("""
+            CREATE SCHEMA IF NOT EXISTS amazon_data;
+            CREATE TABLE IF NOT EXISTS amazon_data.inventory_snapshot (
+                seller_sku                TEXT          NOT NULL,
+                country                   TEXT          NOT NULL,
+                snapshot_timestamp        TIMESTAMPTZ   NOT NULL,
+                fulfillable_quantity      INTEGER       NOT NULL,
+                unfulfillable_quantity    INTEGER       NOT NULL,
+                inbound_working_quantity  INTEGER       NOT NULL,
+                inbound_shipped_quantity  INTEGER       NOT NULL,
+                inbound_received_quantity INTEGER       NOT NULL,
+                reserved_quantity         INTEGER       NOT NULL,
+                total_quantity            INTEGER       NOT NULL,
+                asin                      TEXT,
+                PRIMARY KEY (seller_sku, country, snapshot_timestamp)
+            );
+            ALTER TABLE amazon_data.inventory_snapshot
+            ADD COLUMN IF NOT EXISTS asin TEXT;
+        """))
 
 
 EU_MARKETPLACES = {
@@ -94,116 +68,275 @@ EU_MARKETPLACES = {
 }
 
 
-# --- AWS STS temporary credentials for SP-API authentication ---
-def get_spapi_credentials():
-    client = boto3.client(
-        'sts',
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-        region_name='us-east-1'
-    )
-    response = client.assume_role(
-        RoleArn=os.getenv("SPAPI_ROLE_ARN"),
-        RoleSessionName="SPAPISession"
-    )
-    creds = response['Credentials']
-    return {
-        "refresh_token": os.getenv("SPAPI_REFRESH_TOKEN"),
-        "lwa_app_id": os.getenv("SPAPI_CLIENT_ID"),
-        "lwa_client_secret": os.getenv("SPAPI_CLIENT_SECRET"),
-        "aws_access_key": creds["AccessKeyId"],
-        "aws_secret_key": creds["SecretAccessKey"],
-        "role_arn": os.getenv("SPAPI_ROLE_ARN"),
-        "session_token": creds["SessionToken"],
-    }
+class IncompleteExtractionError(Exception):
+    """One or more marketplaces could not be read to the end. Whatever was
+    fetched has been loaded and checkpointed; a rerun resumes from there."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__(
+            "inventory extraction failed for "
+            + ", ".join(f"{country} ({error})" for country, error in failures.items())
+        )
+
+
+def iter_inventory_page_tokens(marketplace, country_code, next_token=None):
+    """Yield (summaries, next_token) per page, starting from next_token if
+    given. The token is the one for the following page; None on the last."""
+    inventory_api = inventories_client(marketplace)
+
+    while True:
+        max_results = int(os.getenv("SPAPI_MAX_RESULTS", 100))
+        response = call_with_backoff(
+            "getInventorySummaries",
+            inventory_api.get_inventory_summary_marketplace,
+            details=True,
+            marketplaceIds=[marketplace.marketplace_id],
+            nextToken=next_token,
+            maxResultsPerPage=max_results
+        )
+        summaries = response.payload.get("inventorySummaries", [])
+        for item in summaries:
+            item['country'] = country_code
+        metrics.count("rows", len(summaries), stage="inventory_extract", country=country_code)
+
+        # getInventorySummaries returns the token under "pagination", not
+        # in the payload; ApiResponse picks it up from either place
+        next_token = response.next_token
+        yield summaries, next_token
+        if not next_token:
+            break
+
+def iter_inventory_pages(marketplace, country_code):
+    for summaries, _ in iter_inventory_page_tokens(marketplace, country_code):
+        yield summaries
 
 def fetch_inventory_for_marketplace(marketplace, country_code):
-    try:
-        print(f"\n🌍 Fetching inventory for {country_code}...")
-        credentials = get_spapi_credentials()
-        inventory_api = Inventories(marketplace=marketplace, credentials=credentials)
-        all_summaries = []
-        next_token = None
-
-        while True:
-            max_results = int(os.getenv("SPAPI_MAX_RESULTS", 100))
-            response = inventory_api.get_inventory_summary_marketplace(
-                details=True,
-                marketplaceIds=[marketplace.marketplace_id],
-                nextToken=next_token,
-                maxResultsPerPage=max_results
-            )
-            summaries = response.payload.get("inventorySummaries", [])
-            for item in summaries:
-                item['country'] = country_code
-            all_summaries.extend(summaries)
-
-            next_token = response.payload.get("nextToken")
-            if not next_token:
-                break
-        print(f"✅ {country_code}: {len(all_summaries)} items")
-        return all_summaries
-    except Exception as e:
-        print(f"❌ {country_code} failed: {e}")
-        return []
+    # errors propagate: an empty list always means an empty marketplace
+    print(f"\n🌍 Fetching inventory for {country_code}...")
+    all_summaries = []
+    for summaries in iter_inventory_pages(marketplace, country_code):
+        all_summaries.extend(summaries)
+    print(f"✅ {country_code}: {len(all_summaries)} items")
+    return all_summaries
 
-def enrich_inventory_with_asins(marketplace, country_code, inventory):
+@metrics.timer("asin_enrichment")
+def enrich_inventory_with_asins(marketplace, country_code, inventory, lookup_engine=None):
+    own_engine = lookup_engine is None
+    if own_engine:
+        lookup_engine = AsinLookupEngine()
     try:
-        print(f"\n🔍 Enriching ASINs for {country_code}...")
-        credentials = get_spapi_credentials()
-        listings_api = ListingsItems(marketplace=marketplace, credentials=credentials)
-        enriched = []
+        pending = []
 
         for item in inventory:
             sku = item.get("sellerSku")
             if item.get("asin"):
-                enriched.append(item)
+                asin_cache.store(sku, country_code, item["asin"])
+                continue
+            hit, asin = asin_cache.lookup(sku, country_code)
+            if hit:
+                if asin:
+                    item["asin"] = asin
                 continue
+            pending.append((item, lookup_engine.submit(marketplace, sku)))
+        metrics.count("asin_lookups", len(pending), country=country_code)
+
+        for item, future in pending:
+            sku = item.get("sellerSku")
             try:
-                response = listings_api.get_listings_item(sellerSku=sku, marketplaceIds=[marketplace.marketplace_id])
-                asin = response.payload.get("asin")
+                asin = future.result()
                 item["asin"] = asin
+                asin_cache.store(sku, country_code, asin)
             except Exception as inner:
                 print(f"⚠️ Could not fetch ASIN for SKU {sku}: {inner}")
-            enriched.append(item)
+                asin_cache.store(sku, country_code, None)
 
-        return enriched
+        return inventory
     except Exception as e:
         print(f"❌ ASIN enrichment failed for {country_code}: {e}")
         return inventory
+    finally:
+        if own_engine:
+            lookup_engine.shutdown()
+
+def iter_marketplace_pages(country_code, marketplace, lookup_engine=None, checkpoint=None):
+    """Fetch and enrich one page at a time so only the current page is in
+    memory. Yields (page, next_token) and starts from the checkpoint's
+    nextToken if there is one. Errors propagate to the caller."""
+    next_token = checkpoint.next_token(country_code) if checkpoint else None
+    if next_token:
+        print(f"\n🌍 Resuming inventory for {country_code} after {checkpoint.progress[country_code]['pages']} pages...")
+    else:
+        print(f"\n🌍 Fetching and enriching inventory for {country_code}...")
+    pages = iter_inventory_page_tokens(marketplace, country_code, next_token)
+    try:
+        first = next(pages)
+    except SellingApiBadRequestException as e:
+        if not next_token:
+            raise
+        # nextTokens expire; the pages loaded before are upserted again
+        print(f"⚠️ {country_code}: saved nextToken was rejected ({e}), starting the marketplace over")
+        checkpoint.restart(country_code)
+        pages = iter_inventory_page_tokens(marketplace, country_code)
+        first = next(pages)
+    count = 0
+    for summaries, token in itertools.chain([first], pages):
+        count += len(summaries)
+        yield enrich_inventory_with_asins(marketplace, country_code, summaries, lookup_engine), token
+    print(f"✅ {country_code}: {count} items")
+
+def stream_inventory(max_workers=1, lookup_engine=None, checkpoint=None):
+    """Yield (country, page, next_token) for every EU marketplace not yet
+    complete in checkpoint.
+
+    With more than one worker, marketplaces are fetched in parallel and pages
+    arrive in completion order through a bounded queue; each marketplace's
+    pages stay in order. A failing marketplace doesn't stop the others;
+    IncompleteExtractionError is raised once they are done."""
+    countries = [
+        country for country in EU_MARKETPLACES
+        if not (checkpoint and checkpoint.is_complete(country))
+    ]
+    failures = {}
+    if max_workers <= 1:
+        for country in countries:
+            try:
+                for page, next_token in iter_marketplace_pages(
+                        country, EU_MARKETPLACES[country], lookup_engine, checkpoint):
+                    yield country, page, next_token
+            except Exception as e:
+                print(f"❌ {country} failed: {e}")
+                failures[country] = e
+        if failures:
+            raise IncompleteExtractionError(failures)
+        return
+
+    pages = queue.Queue(maxsize=max_workers * 2)
+    stop = threading.Event()
+    done = object()
+
+    def produce(country):
+        try:
+            for page, next_token in iter_marketplace_pages(
+                    country, EU_MARKETPLACES[country], lookup_engine, checkpoint):
+                while not stop.is_set():
+                    try:
+                        pages.put((country, page, next_token), timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except Exception as e:
+            print(f"❌ {country} failed: {e}")
+            failures[country] = e
+        finally:
+            pages.put(done)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for country in countries:
+            pool.submit(produce, country)
+        remaining = len(countries)
+        try:
+            while remaining:
+                item = pages.get()
+                if item is done:
+                    remaining -= 1
+                    continue
+                yield item
+        finally:
+            # Unblock producers if the consumer stopped early
+            stop.set()
+            while remaining:
+                if pages.get() is done:
+                    remaining -= 1
+    if failures:
+        raise IncompleteExtractionError(failures)
+
+def run_daily_inventory_report(max_workers=None, on_page=None, collect=True, load_page=None, checkpoint=None):
+    """Extract, enrich and upsert today's inventory page by page.
 
-def run_daily_inventory_report():
+    Each enriched page is normalized and flushed to inventory_snapshot, then
+    handed to on_page. load_page(page, batch_ts) replaces the default
+    normalize_and_upsert for callers that write the snapshot themselves.
+    The merged list is only built when collect is true; otherwise an empty
+    list is returned and callers should use on_page.
+
+    With a checkpoint (etl.checkpoint.InventoryCheckpoint) the run uses the
+    checkpoint's batch timestamp, records every loaded page and skips what
+    an earlier attempt already loaded; those pages are then only in
+    inventory_snapshot, not in on_page or the returned list. Raises
+    IncompleteExtractionError if any marketplace failed."""
     print(f"\n📦 Daily Amazon FBA Inventory Report - {datetime.now().strftime('%Y-%m-%d')}")
     print("=" * 60)
+    if checkpoint and checkpoint.extracted:
+        print("✅ Already extracted; the pages are in inventory_snapshot.")
+        return []
+
+    # Marketplaces can be fetched and enriched in parallel; the shared rate
+    # limiters keep every worker within the SP-API usage plans.
+    if max_workers is None:
+        max_workers = int(os.getenv("INVENTORY_MAX_WORKERS", 1))
 
-    all_inventory = []
-    for country, marketplace in EU_MARKETPLACES.items():
-        inv = fetch_inventory_for_marketplace(marketplace, country)
-        if not inv:
-            continue
-        enriched_inv = enrich_inventory_with_asins(marketplace, country, inv)
-        all_inventory.extend(enriched_inv)
+    # one snapshot timestamp for the whole run, kept across resumes
+    batch_ts = checkpoint.batch_ts if checkpoint else datetime.utcnow()
+    asin_cache.reset_stats()
+    if os.getenv("SNAPSHOT_WRITE_MODE", "full") != "delta":
+        # full writes don't keep the delta hashes up to date
+        from etl.snapshot_delta import drop_state
+        drop_state()
+    # Pages can arrive interleaved when running concurrently; collect per
+    # country so the merged list keeps the EU_MARKETPLACES order.
+    collected = {country: [] for country in EU_MARKETPLACES} if collect else None
+    total_items = 0
 
-    if not all_inventory:
-        print("⚠️ No inventory data returned.")
+    # One lookup engine per run, so a SKU listed in several marketplaces
+    # is only sent to the Listings API once.
+    lookup_engine = AsinLookupEngine()
+    try:
+        for country, page, next_token in stream_inventory(max_workers, lookup_engine, checkpoint):
+            if page:
+                total_items += len(page)
+                # Normalize quantities by UOM and upsert into central DB
+                (load_page or normalize_and_upsert)(page, batch_ts)
+                if on_page:
+                    on_page(page)
+                if collect:
+                    collected[country].extend(page)
+            # only once the page is loaded, so a resume never skips it
+            if checkpoint:
+                checkpoint.page_done(country, next_token, len(page))
+    finally:
+        lookup_engine.shutdown()
+        asin_cache.flush()
+        asin_cache.report()
+
+    if not total_items:
+        if checkpoint and checkpoint.resumed:
+            print("✅ Nothing left to fetch; the earlier pages are already in inventory_snapshot.")
+        else:
+            print("⚠️ No inventory data returned.")
         return []
 
-    print(f"\n✅ Total enriched inventory items: {len(all_inventory)}")
+    print(f"\n✅ Total enriched inventory items: {total_items}")
     print("=" * 60)
-    # Normalize quantities by UOM and upsert into central DB
-    normalize_and_upsert(all_inventory)
-    return all_inventory
+    if not collect:
+        return []
+    return [item for country in EU_MARKETPLACES for item in collected[country]]
 
 
 # --- Normalize and upsert inventory snapshot ---
-def normalize_and_upsert(inventory_items):
+def normalize_inventory(inventory_items, batch_ts=None, as_records=False):
     # take one timestamp for this batch
-    batch_ts = datetime.utcnow()
-    rows = []
+    if batch_ts is None:
+        batch_ts = datetime.utcnow()
+    uom_map = get_uom_map()
+    # SnapshotRow(...) and dict(...) take the same keywords
+    make_row = SnapshotRow if as_records else dict
     for item in inventory_items:
         master = item.get('asin')
         seller = item.get('sellerSku')
-        factor = UOM_MAP.get((master, seller), 1)
+        factor = uom_map.get((master, seller), 1)
         inv = item.get('inventoryDetails', {})
         fulfillable = inv.get('fulfillableQuantity', 0) * factor
         unfulfillable = inv.get('unfulfillableQuantity', {}).get('totalUnfulfillableQuantity', 0) * factor
@@ -222,30 +355,98 @@ def normalize_and_upsert(inventory_items):
                 snapshot = batch_ts
         else:
             snapshot = batch_ts
-        rows.append({
-            "seller_sku": seller,
-            "country": item.get('country'),
-            "snapshot_timestamp": snapshot,
-            "fulfillable_quantity": fulfillable,
-            "unfulfillable_quantity": unfulfillable,
-            "inbound_working_quantity": inbound_working,
-            "inbound_shipped_quantity": inbound_shipped,
-            "inbound_received_quantity": inbound_received,
-            "reserved_quantity": reserved,
-            "total_quantity": total
-        })
-    with engine.begin() as conn:
+        yield make_row(
+            seller_sku=seller,
+            country=item.get('country'),
+            snapshot_timestamp=snapshot,
+            fulfillable_quantity=fulfillable,
+            unfulfillable_quantity=unfulfillable,
+            inbound_working_quantity=inbound_working,
+            inbound_shipped_quantity=inbound_shipped,
+            inbound_received_quantity=inbound_received,
+            reserved_quantity=reserved,
+            total_quantity=total,
+            asin=master
+        )
+
+def upsert_snapshot_rows(rows):
+    if not rows:
+        return
+    with get_postgres_engine().begin() as conn:
         conn.execute(text("""
             INSERT INTO amazon_data.inventory_snapshot
                 (seller_sku, country, snapshot_timestamp, fulfillable_quantity,
                  unfulfillable_quantity, inbound_working_quantity,
                  inbound_shipped_quantity, inbound_received_quantity,
-                 reserved_quantity, total_quantity)
+                 reserved_quantity, total_quantity, asin)
             VALUES
                 (:seller_sku, :country, :snapshot_timestamp, :fulfillable_quantity,
                  :unfulfillable_quantity, :inbound_working_quantity,
                  :inbound_shipped_quantity, :inbound_received_quantity,
-                 :reserved_quantity, :total_quantity)
+                 :reserved_quantity, :total_quantity, :asin)
+            ON CONFLICT (seller_sku, country, snapshot_timestamp) DO UPDATE SET
+                fulfillable_quantity = EXCLUDED.fulfillable_quantity,
+                unfulfillable_quantity = EXCLUDED.unfulfillable_quantity,
+                inbound_working_quantity = EXCLUDED.inbound_working_quantity,
+                inbound_shipped_quantity = EXCLUDED.inbound_shipped_quantity,
+                inbound_received_quantity = EXCLUDED.inbound_received_quantity,
+                reserved_quantity = EXCLUDED.reserved_quantity,
+                total_quantity = EXCLUDED.total_quantity,
+                asin = EXCLUDED.asin
+        """), [row_dict(row, SNAPSHOT_COLUMNS) for row in rows])
+
+SNAPSHOT_COLUMNS = [
+    "seller_sku", "country", "snapshot_timestamp", "fulfillable_quantity",
+    "unfulfillable_quantity", "inbound_working_quantity",
+    "inbound_shipped_quantity", "inbound_received_quantity",
+    "reserved_quantity", "total_quantity", "asin",
+]
+
+def copy_snapshot_rows(rows):
+    """COPY rows into a temp staging table, then merge them with one
+    set-based upsert. Same semantics as upsert_snapshot_rows: the last row
+    for a key wins and existing rows get their quantities updated."""
+    if not rows:
+        return
+    # \N marks NULL, so an empty-string ASIN stays '' as on the upsert path
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow(["\\N" if value is None else value for value in row_values(row, SNAPSHOT_COLUMNS)])
+    metrics.count("bytes", buf.tell(), stage="inventory_snapshot_copy")
+    buf.seek(0)
+
+    columns = ", ".join(SNAPSHOT_COLUMNS)
+    with get_postgres_engine().begin() as conn:
+        # Quantities are staged as NUMERIC because UOM factors can make them
+        # fractional; psycopg2 sends floats as numeric literals too, so the
+        # merge rounds them to integer exactly like the upsert path.
+        conn.exec_driver_sql("""
+            CREATE TEMP TABLE inventory_snapshot_stage (
+                load_seq                  BIGSERIAL,
+                seller_sku                TEXT,
+                country                   TEXT,
+                snapshot_timestamp        TIMESTAMPTZ,
+                fulfillable_quantity      NUMERIC,
+                unfulfillable_quantity    NUMERIC,
+                inbound_working_quantity  NUMERIC,
+                inbound_shipped_quantity  NUMERIC,
+                inbound_received_quantity NUMERIC,
+                reserved_quantity         NUMERIC,
+                total_quantity            NUMERIC,
+                asin                      TEXT
+            ) ON COMMIT DROP
+        """)
+        cursor = conn.connection.cursor()
+        cursor.copy_expert(
+            f"COPY inventory_snapshot_stage ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf
+        )
+        cursor.close()
+        conn.exec_driver_sql(f"""
+            INSERT INTO amazon_data.inventory_snapshot ({columns})
+            SELECT DISTINCT ON (seller_sku, country, snapshot_timestamp) {columns}
+            FROM inventory_snapshot_stage
+            ORDER BY seller_sku, country, snapshot_timestamp, load_seq DESC
             ON CONFLICT (seller_sku, country, snapshot_timestamp) DO UPDATE SET
                 fulfillable_quantity = EXCLUDED.fulfillable_quantity,
                 unfulfillable_quantity = EXCLUDED.unfulfillable_quantity,
@@ -253,8 +454,49 @@ def normalize_and_upsert(inventory_items):
                 inbound_shipped_quantity = EXCLUDED.inbound_shipped_quantity,
                 inbound_received_quantity = EXCLUDED.inbound_received_quantity,
                 reserved_quantity = EXCLUDED.reserved_quantity,
-                total_quantity = EXCLUDED.total_quantity
-        """), rows)
+                total_quantity = EXCLUDED.total_quantity,
+                asin = EXCLUDED.asin
+        """)
+
+def _load_snapshot_rows(rows, method):
+    with metrics.timer("snapshot_flush", method=method):
+        if method == "copy":
+            copy_snapshot_rows(rows)
+        else:
+            upsert_snapshot_rows(rows)
+    metrics.count("rows", len(rows), stage="inventory_snapshot")
+
+def write_snapshot_rows(rows, method=None, batch_ts=None, mode=None):
+    # SNAPSHOT_LOAD_METHOD: "upsert" (row-wise executemany) or "copy"
+    if method is None:
+        method = os.getenv("SNAPSHOT_LOAD_METHOD", "upsert")
+    # SNAPSHOT_WRITE_MODE: "full" writes every row, "delta" only rows whose
+    # quantities changed since the last run (see etl.snapshot_delta)
+    if mode is None:
+        mode = os.getenv("SNAPSHOT_WRITE_MODE", "full")
+    if mode == "delta":
+        from etl.snapshot_delta import write_changed_rows
+        _, unchanged = write_changed_rows(
+            rows, batch_ts or datetime.utcnow(), lambda changed: _load_snapshot_rows(changed, method)
+        )
+        metrics.count("rows", unchanged, stage="inventory_snapshot_unchanged")
+        return
+    _load_snapshot_rows(rows, method)
+
+@metrics.timer("normalize_and_upsert")
+def normalize_and_upsert(inventory_items, batch_ts=None, method=None):
+    # Flush in bounded batches so memory stays flat for large inputs
+    batch_size = int(os.getenv("SNAPSHOT_BATCH_SIZE", 1000))
+    if batch_ts is None:
+        batch_ts = datetime.utcnow()
+    rows = []
+    for row in normalize_inventory(inventory_items, batch_ts, as_records=True):
+        rows.append(row)
+        if len(rows) >= batch_size:
+            write_snapshot_rows(rows, method, batch_ts)
+            rows = []
+    write_snapshot_rows(rows, method, batch_ts)
 
 if __name__ == "__main__":
-    run_daily_inventory_report()
\ No newline at end of file
+    ensure_snapshot_table()
+    run_daily_inventory_report()
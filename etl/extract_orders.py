@@ -1,26 +1,141 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
 from dotenv import load_dotenv
-from sp_api.api import Orders
-from sp_api.base import Marketplaces, SellingApiException
+from sp_api.base import SellingApiException
+from sqlalchemy import text
+
+from etl import metrics
+from etl.db import get_postgres_engine
+from etl.extract_inventory import EU_MARKETPLACES
+from etl.rate_limit import call_with_backoff
+from etl.transport import orders_client
 
 # This file contains the function to fetch real order data from Amazon SP API.
-# It is designed to be replaced or mocked during development.
+# Orders are fetched incrementally: each marketplace remembers how far it has
+# been read (amazon_data.orders_watermark) and only asks for orders updated
+# since then.
 
 load_dotenv()
 
-def fetch_orders():
-    try:
-        print("Fetching orders from Amazon...")
+SPAPI_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone(timezone.utc)
+
+
+def ensure_watermark_table(conn):
+    conn.execute(text("""
+        CREATE SCHEMA IF NOT EXISTS amazon_data;
+        CREATE TABLE IF NOT EXISTS amazon_data.orders_watermark (
+            country             TEXT          PRIMARY KEY,
+            last_updated_after  TIMESTAMPTZ   NOT NULL,
+            updated_at          TIMESTAMPTZ   NOT NULL DEFAULT now()
+        );
+    """))
+
+
+def load_order_watermarks():
+    with get_postgres_engine().begin() as conn:
+        ensure_watermark_table(conn)
+        rows = conn.execute(text(
+            "SELECT country, last_updated_after FROM amazon_data.orders_watermark"
+        )).all()
+    return {country: last_updated_after for country, last_updated_after in rows}
+
+
+def save_order_watermarks(watermarks):
+    """Record how far each marketplace has been read. Call this only once
+    the fetched orders are loaded, so a failed load is fetched again."""
+    if not watermarks:
+        return
+    with get_postgres_engine().begin() as conn:
+        ensure_watermark_table(conn)
+        conn.execute(text("""
+            INSERT INTO amazon_data.orders_watermark (country, last_updated_after)
+            VALUES (:country, :last_updated_after)
+            ON CONFLICT (country) DO UPDATE SET
+                last_updated_after = GREATEST(amazon_data.orders_watermark.last_updated_after,
+                                              EXCLUDED.last_updated_after),
+                updated_at = now()
+        """), [
+            {"country": country, "last_updated_after": last_updated_after}
+            for country, last_updated_after in watermarks.items()
+        ])
+
+
+def iter_order_pages(marketplace, last_updated_after):
+    """Yield getOrders payloads for orders updated after last_updated_after,
+    following NextToken until the last page."""
+    params = {"LastUpdatedAfter": last_updated_after.strftime(SPAPI_TIME_FORMAT)}
+    while True:
+        # getOrders allows about one request a minute, so a long pagination
+        # can outlive the STS session; take fresh credentials for each page
+        orders_api = orders_client(marketplace)
+        response = call_with_backoff(
+            "getOrders", orders_api.get_orders,
+            MarketplaceIds=[marketplace.marketplace_id], **params
+        )
+        payload = response.payload or {}
+        yield payload
+        next_token = payload.get("NextToken")
+        if not next_token:
+            break
+        params = {"NextToken": next_token}
+
+
+def fetch_marketplace_orders(country, marketplace, last_updated_after):
+    """All orders in one marketplace updated since last_updated_after, plus
+    the watermark to store once they are loaded."""
+    orders = []
+    watermark = None
+    for payload in iter_order_pages(marketplace, last_updated_after):
+        orders.extend(payload.get("Orders", []))
+        # LastUpdatedBefore is the upper bound SP-API applied to the query;
+        # the next run continues from there
+        if watermark is None and payload.get("LastUpdatedBefore"):
+            watermark = _parse_time(payload["LastUpdatedBefore"])
+    if watermark is None:
+        updated = [_parse_time(order["LastUpdateDate"]) for order in orders if order.get("LastUpdateDate")]
+        watermark = max(updated, default=last_updated_after)
+    metrics.count("rows", len(orders), stage="orders_extract", country=country)
+    print(f"✅ {country}: {len(orders)} orders updated since {last_updated_after:%Y-%m-%d %H:%M}")
+    return orders, watermark
+
+
+def fetch_orders(marketplaces=None, max_workers=None, since=None):
+    """Fetch orders changed since the last successful run, one marketplace
+    per worker. Returns (orders, watermarks); pass watermarks to
+    save_order_watermarks after loading. A marketplace that fails keeps its
+    old watermark and is read again next time. since (a datetime) replaces
+    the stored watermarks, e.g. for a backfill."""
+    if marketplaces is None:
+        marketplaces = EU_MARKETPLACES
+    if max_workers is None:
+        max_workers = int(os.getenv("ORDERS_MAX_WORKERS", len(marketplaces)))
+    start = _parse_time(os.getenv("ORDERS_START_DATE", "2024-01-01T00:00:00Z"))
+
+    print("Fetching orders from Amazon...")
+    saved = load_order_watermarks() if since is None else {country: since for country in marketplaces}
 
-        orders_api = Orders(marketplace=Marketplaces.US)
-        # Example of expanded parameters for production:
-        # response = orders_api.get_orders(CreatedAfter='2024-01-01T00:00:00Z', MarketplaceIds=['ATVPDKIKX0DER'], OrderStatuses=['Shipped', 'Unshipped'])
-        response = orders_api.get_orders(CreatedAfter='2024-01-01T00:00:00Z')
+    def fetch(country):
+        try:
+            return fetch_marketplace_orders(country, marketplaces[country], saved.get(country, start))
+        except SellingApiException as e:
+            print(f"Amazon SP API error for {country}:", e)
+            return None
 
-        orders = response.payload.get("Orders", [])
-        print(f"Fetched {len(orders)} orders.")
-        return orders
+    orders = []
+    watermarks = {}
+    # the shared getOrders limiter paces the workers together
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="orders") as pool:
+        for country, result in zip(marketplaces, pool.map(fetch, marketplaces)):
+            if result is None:
+                continue
+            marketplace_orders, watermarks[country] = result
+            orders.extend(marketplace_orders)
 
-    except SellingApiException as e:
-        print("Amazon SP API error:", e)
-        return []
\ No newline at end of file
+    print(f"Fetched {len(orders)} orders.")
+    return orders, watermarks
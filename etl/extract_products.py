@@ -3,9 +3,12 @@
 
 import os
 from dotenv import load_dotenv
-from sp_api.api import ListingsItems
 from sp_api.base import Marketplaces, SellingApiException
 
+from etl import metrics
+from etl.rate_limit import call_with_backoff
+from etl.transport import listings_client
+
 load_dotenv()
 
 def fetch_products(seller_skus=None):
@@ -15,15 +18,19 @@ def fetch_products(seller_skus=None):
         # Example with SKUs — I have to pass a list or fetch dynamically
         skus = seller_skus or ["SKU-001", "SKU-002"]
 
+        listings_api = listings_client(Marketplaces.US)
         products = []
         for sku in skus:
-            result = ListingsItems(marketplace=Marketplaces.US).get_listings_item(
+            result = call_with_backoff(
+                "getListingsItem",
+                listings_api.get_listings_item,
                 sellerId=os.getenv("SP_API_SELLER_ID"),  # if required
                 sku=sku,
                 includedData=["attributes", "summaries", "issues", "fulfillmentAvailability"]
             )
             products.append(result.payload)
 
+        metrics.count("rows", len(products), stage="products_extract")
         print(f"Fetched {len(products)} products.")
         return products
 
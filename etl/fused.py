@@ -0,0 +1,118 @@
+"""
+Single-pass inventory stage. Each raw inventory summary is parsed exactly
+once into an InventoryRecord; that record is written as the
+inventory_snapshot row and projected into the amazon_inventory row and the
+columns the daily summary needs, so the summary no longer has to read the
+snapshot back out of Postgres.
+"""
+
+import os
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from etl import metrics
+from etl.extract_inventory import write_snapshot_rows
+from etl.load_inventory import insert_inventory_to_db
+from etl.records import InventoryRecord, InventoryRow, as_integer
+from etl.uom import get_uom_map
+
+
+def _clean(value, default):
+    if isinstance(value, str) and value.strip():
+        return value.strip().upper()
+    return default
+
+
+def parse_summary(item, batch_ts, uom_map):
+    """The work of normalize_inventory and transform_inventory for one item."""
+    master = item.get('asin')
+    seller = item.get('sellerSku')
+    factor = uom_map.get((master, seller), 1)
+    inv = item.get('inventoryDetails', {})
+
+    raw_ts = item.get('lastUpdatedTime')
+    snapshot = batch_ts
+    if raw_ts:
+        try:
+            snapshot = datetime.fromisoformat(raw_ts.replace('Z', '+00:00'))
+        except Exception:
+            print(f"⚠️ Could not parse timestamp {raw_ts} for SKU {seller}, defaulting to batch time")
+
+    try:
+        quantity = int(item.get('totalQuantity', 0))
+    except (TypeError, ValueError):
+        quantity = 0
+
+    fulfillment_center = item.get('fulfillmentCenterId')
+    return InventoryRecord(
+        seller_sku=seller,
+        asin=master,
+        country=item.get('country'),
+        snapshot_timestamp=snapshot,
+        fulfillable_quantity=inv.get('fulfillableQuantity', 0) * factor,
+        unfulfillable_quantity=inv.get('unfulfillableQuantity', {}).get('totalUnfulfillableQuantity', 0) * factor,
+        inbound_working_quantity=inv.get('inboundWorkingQuantity', 0) * factor,
+        inbound_shipped_quantity=inv.get('inboundShippedQuantity', 0) * factor,
+        inbound_received_quantity=inv.get('inboundReceivingQuantity', 0) * factor,
+        reserved_quantity=inv.get('reservedQuantity', {}).get('totalReservedQuantity', 0) * factor,
+        total_quantity=item.get('totalQuantity', 0) * factor,
+        clean_asin=master.strip().upper() if isinstance(master, str) else 'UNKNOWN',
+        clean_sku=seller.strip().upper() if isinstance(seller, str) else 'UNKNOWN',
+        fulfillment_center=fulfillment_center.strip().upper() if isinstance(fulfillment_center, str) else None,
+        condition_type=_clean(item.get('condition'), 'UNKNOWN'),
+        quantity=quantity,
+        last_updated=raw_ts.replace("T", " ").replace("Z", "") if raw_ts else None,
+        clean_country=_clean(item.get('country'), 'N/A'),
+    )
+
+
+def inventory_row(record):
+    # same row transform_inventory builds
+    return InventoryRow(
+        asin=record.clean_asin,
+        sku=record.clean_sku,
+        fulfillment_center=record.fulfillment_center,
+        condition_type=record.condition_type,
+        quantity=record.quantity,
+        last_updated=record.last_updated,
+        country=record.clean_country,
+    )
+
+
+class FusedInventoryStage:
+    """Loads each page into inventory_snapshot and amazon_inventory and keeps
+    the few snapshot columns summarize_inventory needs in memory."""
+
+    SUMMARY_COLUMNS = ["seller_sku", "country", "total_quantity", "snapshot_timestamp", "asin"]
+
+    def __init__(self, method=None):
+        self.method = method
+        self.batch_size = int(os.getenv("SNAPSHOT_BATCH_SIZE", 1000))
+        self.items = 0
+        self._summary = {column: [] for column in self.SUMMARY_COLUMNS}
+
+    def load_page(self, page, batch_ts):
+        uom_map = get_uom_map()
+        for start in range(0, len(page), self.batch_size):
+            with metrics.timer("transform", stage="fused_parse"):
+                records = [parse_summary(item, batch_ts, uom_map) for item in page[start:start + self.batch_size]]
+                rows = [inventory_row(record) for record in records]
+            # records carry every snapshot column under the same name
+            write_snapshot_rows(records, self.method, batch_ts)
+            insert_inventory_to_db(rows)
+            for column, values in self._summary.items():
+                values.extend(getattr(record, column) for record in records)
+        self.items += len(page)
+
+    def summary_frame(self):
+        """This run's snapshot rows, as summarize_frame expects them."""
+        frame = pd.DataFrame(self._summary, columns=self.SUMMARY_COLUMNS)
+        frame["total_quantity"] = [as_integer(value) for value in frame["total_quantity"]]
+        # the batch timestamp is naive UTC, item timestamps are aware
+        frame["snapshot_timestamp"] = pd.to_datetime(
+            [ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts
+             for ts in frame["snapshot_timestamp"]],
+            utc=True,
+        )
+        return frame
@@ -0,0 +1,77 @@
+"""
+Inventory history for dashboards, read from amazon_data.inventory_daily,
+the daily rollup archive_snapshot keeps up to date (one row per SKU,
+country and day a quantity was observed, indexed by asin, country and
+date), so a series is an index range scan rather than a pass over the
+archive.
+
+    stock_series(asin="B0EXAMPLE01", countries=["DE", "FR"], start="2026-07-01")
+    stock_series(sku="ABC-123", freq="W")
+
+The result has one row per period and one column per country. A SKU's
+quantity holds from the day it was observed until its next observation
+(the last one before start seeds the series); days before a SKU's first
+observation are NaN.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+from sqlalchemy import text
+
+from etl.db import get_postgres_engine
+
+DEFAULT_DAYS = 90
+
+
+def _as_date(value):
+    return pd.Timestamp(value).date() if value is not None else None
+
+
+def _stock_rows(conn, column, key, countries, start, end):
+    # the observations in [start, end] plus each SKU's last one before start
+    country_filter = "AND country = ANY(:countries)" if countries else ""
+    return pd.read_sql(text(f"""
+        SELECT snapshot_date, seller_sku, country, total_quantity, 1 AS observed
+        FROM amazon_data.inventory_daily
+        WHERE {column} = :key {country_filter}
+          AND snapshot_date BETWEEN :start AND :end
+        UNION ALL
+        (SELECT DISTINCT ON (seller_sku, country)
+                CAST(:start AS date), seller_sku, country, total_quantity, 0
+         FROM amazon_data.inventory_daily
+         WHERE {column} = :key {country_filter}
+           AND snapshot_date < :start
+         ORDER BY seller_sku, country, snapshot_date DESC)
+    """), conn, params={"key": key, "countries": list(countries or []), "start": start, "end": end})
+
+
+def stock_series(asin=None, sku=None, countries=None, start=None, end=None, freq="D", engine=None):
+    """Total quantity per day (or per freq period, taking its last day)
+    for one ASIN, summed over its SKUs, or for one seller SKU.
+    start/end are inclusive and default to the last 90 days."""
+    if (asin is None) == (sku is None):
+        raise ValueError("stock_series needs exactly one of asin or sku")
+    if isinstance(countries, str):
+        countries = [countries]
+
+    end = _as_date(end) or datetime.now(timezone.utc).date()
+    start = _as_date(start) or end - timedelta(days=DEFAULT_DAYS - 1)
+    column, key = ("asin", asin) if asin is not None else ("seller_sku", sku)
+
+    with (engine or get_postgres_engine()).connect() as conn:
+        rows = _stock_rows(conn, column, key, countries, start, end)
+
+    # a seed row and an observation on start itself: the observation wins
+    rows = rows.sort_values("observed").drop_duplicates(
+        subset=["snapshot_date", "seller_sku", "country"], keep="last")
+    per_sku = rows.pivot(index="snapshot_date", columns=["country", "seller_sku"], values="total_quantity")
+    per_sku.index = pd.to_datetime(per_sku.index)
+    per_sku = per_sku.reindex(pd.date_range(start, end, freq="D", name="date")).ffill()
+    series = per_sku.T.groupby(level="country").sum(min_count=1).T
+    if countries:
+        series = series.reindex(columns=list(countries))
+    series.columns.name = None
+    if freq != "D":
+        series = series.resample(freq).last()
+    return series
@@ -1,20 +1,43 @@
-import psycopg2
+from psycopg2.extras import execute_values
+import pandas as pd
 import os
 from dotenv import load_dotenv
 
+from etl import metrics
+from etl.db import get_postgres_engine
+
 load_dotenv()
 
-def insert_inventory_to_db(inventory):
-    conn = psycopg2.connect(
-        host=os.getenv("POSTGRES_HOST"),
-        user=os.getenv("POSTGRES_USER"),
-        password=os.getenv("POSTGRES_PASSWORD"),
-        dbname=os.getenv("POSTGRES_DB"),
-        port=int(os.getenv("POSTGRES_PORT"))
-    )
-    conn.autocommit = True
-    cursor = conn.cursor()
+FULFILLMENT_COUNTRY_MAP = {
+    'FRA': 'DE', 'DEH': 'DE', 'MAD': 'ES', 'MXP': 'IT', 'CDG': 'FR', 'AMS': 'NL',
+    'WAW': 'PL', 'STO': 'SE', 'BRU': 'BE'
+}
+
+INSERT_COLUMNS = "asin, sku, fulfillment_center, condition_type, quantity, last_updated, country"
+
+_table_ready = False
+
+
+def guess_country_from_fc(fc_id, default):
+    if fc_id and isinstance(fc_id, str):
+        prefix = fc_id[:3].upper()
+        return FULFILLMENT_COUNTRY_MAP.get(prefix, default)
+    return default
+
+
+def guess_countries_from_fc(fc_ids, defaults):
+    # Vectorized guess_country_from_fc over a whole batch: non-string
+    # fulfillment centers give NaN from .str and fall back to the default.
+    guessed = pd.Series(fc_ids, dtype=object).str[:3].str.upper().map(FULFILLMENT_COUNTRY_MAP)
+    countries = guessed.where(guessed.notna(), pd.Series(defaults, dtype=object)).astype(object)
+    # missing defaults come back as NaN; the DB needs None
+    return countries.where(countries.notna(), None).tolist()
 
+
+def ensure_inventory_table(cursor):
+    global _table_ready
+    if _table_ready:
+        return
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS amazon_data.amazon_inventory (
             id SERIAL PRIMARY KEY,
@@ -28,45 +51,92 @@ def insert_inventory_to_db(inventory):
             UNIQUE (asin, sku, country)
         );
     """)
+    _table_ready = True
+
+
+def _field(item, name, default=None):
+    # batches hold transform_inventory dicts or InventoryRow records
+    if isinstance(item, dict):
+        return item.get(name, default)
+    return getattr(item, name)
+
 
-    insert_query = """
-        INSERT INTO amazon_data.amazon_inventory (
-            asin, sku, fulfillment_center, condition_type, quantity, last_updated, country
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT (asin, sku, country) DO NOTHING
-    """
+def inventory_rows(batch):
+    countries = guess_countries_from_fc(
+        [_field(item, 'fulfillment_center') for item in batch],
+        [_field(item, 'country') for item in batch]
+    )
+    return [
+        (
+            _field(item, 'asin'),
+            _field(item, 'sku'),
+            _field(item, 'fulfillment_center'),
+            _field(item, 'condition_type'),
+            _field(item, 'quantity', 0),
+            _field(item, 'last_updated'),
+            country
+        )
+        for item, country in zip(batch, countries)
+    ]
 
-    FULFILLMENT_COUNTRY_MAP = {
-        'FRA': 'DE', 'DEH': 'DE', 'MAD': 'ES', 'MXP': 'IT', 'CDG': 'FR', 'AMS': 'NL',
-        'WAW': 'PL', 'STO': 'SE', 'BRU': 'BE'
-    }
 
-    def guess_country_from_fc(fc_id, default):
-        if fc_id and isinstance(fc_id, str):
-            prefix = fc_id[:3].upper()
-            return FULFILLMENT_COUNTRY_MAP.get(prefix, default)
-        return default
+def insert_batch(cursor, batch, page_size):
+    """Insert one batch under a savepoint; if the batch fails, retry it row by
+    row so only the offending rows are reported and skipped."""
+    rows = inventory_rows(batch)
+    cursor.execute("SAVEPOINT inventory_batch")
+    try:
+        execute_values(cursor, f"""
+            INSERT INTO amazon_data.amazon_inventory ({INSERT_COLUMNS})
+            VALUES %s
+            ON CONFLICT (asin, sku, country) DO NOTHING
+        """, rows, page_size=page_size)
+        cursor.execute("RELEASE SAVEPOINT inventory_batch")
+        return len(rows)
+    except Exception as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT inventory_batch")
+        print(f"⚠️ Batch of {len(rows)} inventory records failed ({e}), retrying row by row")
 
     successful_inserts = 0
-    for item in inventory:
+    for item, row in zip(batch, rows):
+        cursor.execute("SAVEPOINT inventory_row")
         try:
-            fc = item.get('fulfillment_center', None)
-            country = item.get('country', None)
-            country = guess_country_from_fc(fc, country)
-            cursor.execute(insert_query, (
-                item.get('asin', None),
-                item.get('sku', None),
-                fc,
-                item.get('condition_type', None),
-                item.get('quantity', 0),
-                item.get('last_updated', None),
-                country
-            ))
+            cursor.execute(f"""
+                INSERT INTO amazon_data.amazon_inventory ({INSERT_COLUMNS})
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (asin, sku, country) DO NOTHING
+            """, row)
+            cursor.execute("RELEASE SAVEPOINT inventory_row")
             successful_inserts += 1
         except Exception as e:
-            print(f"❌ Failed to insert item {item.get('sku')}: {e}")
+            cursor.execute("ROLLBACK TO SAVEPOINT inventory_row")
+            print(f"❌ Failed to insert item {_field(item, 'sku')}: {e}")
+    cursor.execute("RELEASE SAVEPOINT inventory_batch")
+    return successful_inserts
+
 
-    cursor.close()
-    conn.close()
+@metrics.timer("load", table="amazon_inventory")
+def insert_inventory_to_db(inventory, page_size=None):
+    if page_size is None:
+        page_size = int(os.getenv("INVENTORY_INSERT_PAGE_SIZE", 500))
+
+    # Borrow a pooled psycopg2 connection; close() hands it back to the pool
+    conn = get_postgres_engine().raw_connection()
+    successful_inserts = 0
+    try:
+        # One transaction for the whole call; failed batches are isolated by
+        # savepoints instead of autocommitting every row.
+        with conn.cursor() as cursor:
+            ensure_inventory_table(cursor)
+            for start in range(0, len(inventory), page_size):
+                batch = inventory[start:start + page_size]
+                successful_inserts += insert_batch(cursor, batch, page_size)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
-    print(f"✅ Inserted {successful_inserts} inventory records into PostgreSQL.")
\ No newline at end of file
+    metrics.count("rows", successful_inserts, stage="amazon_inventory")
+    print(f"✅ Inserted {successful_inserts} inventory records into PostgreSQL.")
@@ -1,7 +1,9 @@
-import pymysql
-import os
 from dotenv import load_dotenv
 
+from etl import metrics
+from etl.db import load_mysql_rows
+from etl.records import row_values
+
 load_dotenv()
 
 # This loads Amazon order data into MySQL, currently using mock data for testing.
@@ -15,40 +17,26 @@ load_dotenv()
 #     'currency_code': 'USD'
 # }
 
-def insert_orders_to_db(orders):
-    conn = pymysql.connect(
-        host=os.getenv("MYSQL_HOST"),
-        user=os.getenv("MYSQL_USER"),
-        password=os.getenv("MYSQL_PASSWORD"),
-        database=os.getenv("MYSQL_DB"),
-        port=int(os.getenv("MYSQL_PORT"))
-    )
-    cursor = conn.cursor()
-
-    for order in orders:
-        # real SP API order:
-        # {
-        #     'amazon_order_id': '123-1234567-1234567',
-        #     'order_status': 'Shipped',
-        #     'purchase_date': '2024-03-01 12:00:00',
-        #     'buyer_email': 'example@marketplace.amazon.com',
-        #     'order_total': 59.99,
-        #     'currency_code': 'USD'
-        # }
-        cursor.execute("""
-            INSERT IGNORE INTO amazon_orders (
-                amazon_order_id, order_status, purchase_date, buyer_email, order_total, currency_code
-            ) VALUES (%s, %s, %s, %s, %s, %s)
-        """, (
-            order['amazon_order_id'],
-            order['order_status'],
-            order['purchase_date'],
-            order['buyer_email'],
-            order['order_total'],
-            order['currency_code']
-        ))
+ORDER_COLUMNS = [
+    "amazon_order_id", "order_status", "purchase_date", "buyer_email", "order_total", "currency_code",
+]
 
-    conn.commit()
-    cursor.close()
-    conn.close()
-    print(f"Inserted {len(orders)} orders into MySQL.")
\ No newline at end of file
+@metrics.timer("load", table="amazon_orders")
+def insert_orders_to_db(orders, chunk_size=None):
+    # orders are transform_orders dicts or OrderRow records; they are sent as
+    # multi-row upserts, committed every MYSQL_LOAD_CHUNK_SIZE rows. The
+    # incremental extract mostly returns known orders whose status or total
+    # changed, so those columns are updated. buyer_email is kept, as
+    # transform_orders fills in a placeholder when the API withholds it.
+    loaded, seconds = load_mysql_rows("""
+        INSERT INTO amazon_orders (
+            amazon_order_id, order_status, purchase_date, buyer_email, order_total, currency_code
+        ) VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            order_status = VALUES(order_status),
+            order_total = VALUES(order_total),
+            currency_code = VALUES(currency_code)
+    """, [row_values(order, ORDER_COLUMNS) for order in orders], chunk_size)
+    metrics.count("rows", loaded, stage="amazon_orders")
+    rate = loaded / seconds if seconds else 0
+    print(f"Inserted or updated {loaded} orders in MySQL ({rate:,.0f} rows/s).")
\ No newline at end of file
@@ -1,7 +1,9 @@
-import pymysql
-import os
 from dotenv import load_dotenv
 
+from etl import metrics
+from etl.db import load_mysql_rows
+from etl.records import row_values
+
 load_dotenv()
 
 # This inserts product data into MySQL, currently using mock data.
@@ -16,47 +18,24 @@ load_dotenv()
 #     'last_updated': '2024-03-24 12:00:00'
 # }
 
-def insert_products_to_db(products):
-    conn = pymysql.connect(
-        host=os.getenv("MYSQL_HOST"),
-        user=os.getenv("MYSQL_USER"),
-        password=os.getenv("MYSQL_PASSWORD"),
-        database=os.getenv("MYSQL_DB"),
-        port=int(os.getenv("MYSQL_PORT"))
-    )
-    cursor = conn.cursor()
-
-    for product in products:
-        # real SP API product:
-        # {
-        #     'asin': 'B08XYZ1234',
-        #     'sku': 'SKU-001',
-        #     'product_title': 'Wireless Mouse',
-        #     'price': 19.99,
-        #     'currency_code': 'USD',
-        #     'stock_quantity': 85,
-        #     'last_updated': '2024-03-24 12:00:00'
-        # }
-        cursor.execute("""
-            INSERT INTO amazon_products (
-                asin, sku, product_title, price, currency_code, stock_quantity, last_updated
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-                price = VALUES(price),
-                currency_code = VALUES(currency_code),
-                stock_quantity = VALUES(stock_quantity),
-                last_updated = VALUES(last_updated)
-        """, (
-            product['asin'],
-            product['sku'],
-            product['product_title'],
-            product['price'],
-            product['currency_code'],
-            product['stock_quantity'],
-            product['last_updated']
-        ))
+PRODUCT_COLUMNS = [
+    "asin", "sku", "product_title", "price", "currency_code", "stock_quantity", "last_updated",
+]
 
-    conn.commit()
-    cursor.close()
-    conn.close()
-    print(f"Inserted or updated {len(products)} products in MySQL.")
\ No newline at end of file
+@metrics.timer("load", table="amazon_products")
+def insert_products_to_db(products, chunk_size=None):
+    # products are transform_products dicts or ProductRow records; they are
+    # sent as multi-row upserts, committed every MYSQL_LOAD_CHUNK_SIZE rows
+    loaded, seconds = load_mysql_rows("""
+        INSERT INTO amazon_products (
+            asin, sku, product_title, price, currency_code, stock_quantity, last_updated
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            price = VALUES(price),
+            currency_code = VALUES(currency_code),
+            stock_quantity = VALUES(stock_quantity),
+            last_updated = VALUES(last_updated)
+    """, [row_values(product, PRODUCT_COLUMNS) for product in products], chunk_size)
+    metrics.count("rows", loaded, stage="amazon_products")
+    rate = loaded / seconds if seconds else 0
+    print(f"Inserted or updated {loaded} products in MySQL ({rate:,.0f} rows/s).")
@@ -0,0 +1,268 @@
+"""
+Run metrics for the ETL: stage timers, counters and peak memory, saved as
+a JSON run report (and optionally a Prometheus textfile) when a pipeline
+run ends.
+
+    with metrics.timer("summary", step="read"):
+        ...
+
+    @metrics.timer("transform", stage="orders")
+    def transform_orders(...):
+        ...
+
+    metrics.count("rows", len(rows), stage="inventory_snapshot")
+
+Timers and counters are keyed by name plus labels and can be used from the
+extractor threads. start_run() clears them and starts sampling RSS in the
+background, so every timer also knows the peak RSS while it was open.
+write_report() saves METRICS_DIR/<run>-<timestamp>.json and, when
+METRICS_PROMETHEUS_FILE is set, writes the same numbers for
+node_exporter's textfile collector. Things are recorded per call, page or
+batch, never per row.
+"""
+
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+_lock = threading.Lock()
+_timers = {}
+_counters = {}
+_active = set()
+_run = {"name": None, "started_at": None, "started": None, "sampler": None}
+
+
+def current_rss():
+    # resident set size in bytes; /proc is Linux only, elsewhere fall back
+    # to the process-wide peak
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class MemorySampler:
+    """Highest RSS seen while running, sampled every interval seconds. Open
+    timers get the samples too."""
+
+    def __init__(self, interval=None):
+        if interval is None:
+            interval = float(os.getenv("METRICS_SAMPLE_INTERVAL", 0.05))
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss()
+        self.peak = max(self.peak, rss)
+        with _lock:
+            for span in _active:
+                span.peak = max(span.peak, rss)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self.peak = current_rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="memory-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class timer:
+    """Times a block (with timer(...)) or every call of a function
+    (@timer(...)). Repeated uses add up under the same name and labels."""
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self.seconds = None
+        self.peak = 0
+
+    def __enter__(self):
+        self.peak = current_rss()
+        with _lock:
+            _active.add(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._start
+        rss = current_rss()
+        with _lock:
+            _active.discard(self)
+            self.peak = max(self.peak, rss)
+            stats = _timers.setdefault(_key(self.name, self.labels), {
+                "count": 0, "seconds": 0.0, "max_seconds": 0.0, "peak_rss": 0, "errors": 0,
+            })
+            stats["count"] += 1
+            stats["seconds"] += self.seconds
+            stats["max_seconds"] = max(stats["max_seconds"], self.seconds)
+            stats["peak_rss"] = max(stats["peak_rss"], self.peak)
+            if exc[0] is not None:
+                stats["errors"] += 1
+        return False
+
+    def __call__(self, func):
+        # a fresh timer per call, so threads don't share start times
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(self.name, **self.labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def count(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def reset():
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+
+def start_run(name):
+    """Clear the metrics and start a run; call write_report() at the end."""
+    stop_sampler()
+    reset()
+    _run["name"] = name
+    _run["started_at"] = datetime.now(timezone.utc)
+    _run["started"] = time.perf_counter()
+    _run["sampler"] = MemorySampler().start()
+
+
+def stop_sampler():
+    sampler = _run.get("sampler")
+    if sampler is not None:
+        sampler.stop()
+        _run["sampler"] = None
+    return sampler
+
+
+def report(status="ok"):
+    """The current run's metrics as a JSON-ready dict."""
+    sampler = _run.get("sampler")
+    if sampler is not None:
+        sampler._sample()
+    started = _run.get("started")
+    with _lock:
+        timers = [
+            {"name": name, "labels": dict(labels), "count": stats["count"],
+             "seconds": round(stats["seconds"], 4), "max_seconds": round(stats["max_seconds"], 4),
+             "peak_rss_mb": round(stats["peak_rss"] / 2**20, 1), "errors": stats["errors"]}
+            for (name, labels), stats in _timers.items()
+        ]
+        counters = [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in _counters.items()
+        ]
+    return {
+        "run": _run.get("name"),
+        "status": status,
+        "started_at": _run["started_at"].isoformat() if _run.get("started_at") else None,
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "duration_s": round(time.perf_counter() - started, 3) if started is not None else None,
+        "peak_rss_mb": round((sampler.peak if sampler else current_rss()) / 2**20, 1),
+        "timers": sorted(timers, key=lambda t: -t["seconds"]),
+        "counters": sorted(counters, key=lambda c: (c["name"], sorted(c["labels"].items()))),
+    }
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+def prometheus_text(run_report):
+    """run_report in the Prometheus text exposition format."""
+    run = {"run": run_report["run"] or "etl"}
+    lines = []
+
+    def metric(name, kind, samples):
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_labels(labels)} {value}")
+
+    timers = run_report["timers"]
+    metric("etl_timer_seconds_total", "counter",
+           [(dict(run, timer=t["name"], **t["labels"]), t["seconds"]) for t in timers])
+    metric("etl_timer_calls_total", "counter",
+           [(dict(run, timer=t["name"], **t["labels"]), t["count"]) for t in timers])
+    metric("etl_timer_errors_total", "counter",
+           [(dict(run, timer=t["name"], **t["labels"]), t["errors"]) for t in timers])
+    metric("etl_timer_max_seconds", "gauge",
+           [(dict(run, timer=t["name"], **t["labels"]), t["max_seconds"]) for t in timers])
+    metric("etl_timer_peak_rss_bytes", "gauge",
+           [(dict(run, timer=t["name"], **t["labels"]), int(t["peak_rss_mb"] * 2**20)) for t in timers])
+    for name in sorted({c["name"] for c in run_report["counters"]}):
+        metric(f"etl_{name}_total", "counter",
+               [(dict(run, **c["labels"]), c["value"]) for c in run_report["counters"] if c["name"] == name])
+    metric("etl_run_duration_seconds", "gauge", [(run, run_report["duration_s"] or 0)])
+    metric("etl_run_peak_rss_bytes", "gauge", [(run, int(run_report["peak_rss_mb"] * 2**20))])
+    metric("etl_run_success", "gauge", [(run, int(run_report["status"] == "ok"))])
+    metric("etl_run_finished_timestamp_seconds", "gauge", [(run, int(time.time()))])
+    return "\n".join(lines) + "\n"
+
+
+def write_report(status="ok", path=None):
+    """Stop sampling and write the run report; returns the report."""
+    run_report = report(status)
+    stop_sampler()
+
+    if path is None:
+        report_dir = os.getenv("METRICS_DIR", "reports")
+        os.makedirs(report_dir, exist_ok=True)
+        started = _run.get("started_at") or datetime.now(timezone.utc)
+        path = os.path.join(report_dir, f"{run_report['run'] or 'etl'}-{started:%Y%m%dT%H%M%S}.json")
+    with open(path, "w") as f:
+        json.dump(run_report, f, indent=2)
+
+    prometheus_file = os.getenv("METRICS_PROMETHEUS_FILE")
+    if prometheus_file:
+        # the textfile collector may read at any time; write then rename
+        text = prometheus_text(run_report)
+        tmp = f"{prometheus_file}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, prometheus_file)
+
+    print(f"\n📈 Run report ({run_report['duration_s']}s, peak RSS {run_report['peak_rss_mb']} MiB) written to {path}")
+    for t in run_report["timers"][:5]:
+        labels = ", ".join(f"{k}={v}" for k, v in t["labels"].items())
+        print(f"   {t['name']}{f' ({labels})' if labels else ''}: {t['seconds']:.2f}s over {t['count']} calls")
+    return run_report
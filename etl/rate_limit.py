@@ -0,0 +1,86 @@
+"""
+Thread-safe token buckets for the SP-API operations used by the extractors.
+SP-API usage plans apply per selling partner and operation, so every thread
+calling the same operation has to draw from the same bucket.
+"""
+
+import os
+import random
+import threading
+import time
+
+from etl import metrics
+
+# Default SP-API usage plans: operation -> (requests per second, burst)
+SPAPI_RATE_LIMITS = {
+    "getInventorySummaries": (2.0, 2),
+    "getListingsItem": (5.0, 10),
+    "getOrders": (0.0167, 20),
+}
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # Reserve a token under the lock, then sleep outside it so other
+        # threads can queue up their own reservations in the meantime.
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(operation):
+    with _limiters_lock:
+        limiter = _limiters.get(operation)
+        if limiter is None:
+            rate, burst = SPAPI_RATE_LIMITS.get(operation, (1.0, 1))
+            # SPAPI_RATE_SCALE speeds every bucket up, e.g. for replay runs
+            rate *= float(os.getenv("SPAPI_RATE_SCALE", 1))
+            limiter = _limiters[operation] = TokenBucket(rate, burst)
+        return limiter
+
+
+def is_throttled(error):
+    return getattr(error, "code", None) == 429 or "QuotaExceeded" in str(error)
+
+
+def call_with_backoff(operation, func, *args, max_retries=None, **kwargs):
+    """Call func under the operation's rate limit, retrying throttled calls
+    with full-jitter exponential backoff."""
+    if max_retries is None:
+        max_retries = int(os.getenv("SPAPI_MAX_RETRIES", 5))
+    base = float(os.getenv("SPAPI_BACKOFF_BASE", 0.5))
+    cap = float(os.getenv("SPAPI_BACKOFF_CAP", 30))
+    limiter = get_limiter(operation)
+    for attempt in range(max_retries + 1):
+        with metrics.timer("rate_limit_wait", operation=operation):
+            limiter.acquire()
+        metrics.count("api_calls", operation=operation)
+        try:
+            with metrics.timer("spapi_call", operation=operation):
+                return func(*args, **kwargs)
+        except Exception as e:
+            throttled = is_throttled(e)
+            if throttled:
+                metrics.count("api_throttles", operation=operation)
+            if attempt == max_retries or not throttled:
+                metrics.count("api_errors", operation=operation)
+                raise
+            metrics.count("api_retries", operation=operation)
+            with metrics.timer("backoff_sleep", operation=operation):
+                time.sleep(random.uniform(0, min(cap, base * 2 ** attempt)))
@@ -0,0 +1,109 @@
+"""
+Compact row types passed between the ETL stages. Each is a slots
+dataclass: a row is one small fixed-size object instead of a dict with its
+own hash table, which is most of the memory a large batch of rows takes.
+The loaders accept these records as well as the dicts the stages used to
+pass around.
+"""
+
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal
+
+
+def row_values(row, columns):
+    """The values of a dict row or a record for the given columns."""
+    if isinstance(row, dict):
+        return tuple(row[column] for column in columns)
+    return tuple(getattr(row, column) for column in columns)
+
+
+def row_dict(row, columns):
+    if isinstance(row, dict):
+        return row
+    return {column: getattr(row, column) for column in columns}
+
+
+def as_integer(value):
+    """What an INTEGER column stores for a quantity: UOM factors can make it
+    a Decimal or float, and Postgres rounds those half away from zero
+    (psycopg2 sends floats as numeric literals)."""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        value = repr(value)
+    return int(Decimal(value).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+@dataclass(slots=True)
+class InventoryRecord:
+    """One parsed inventory summary (see etl.fused). The first fields are
+    the inventory_snapshot columns; the clean_* ones feed amazon_inventory."""
+    seller_sku: str
+    asin: str
+    country: str
+    snapshot_timestamp: object
+    fulfillable_quantity: float
+    unfulfillable_quantity: float
+    inbound_working_quantity: float
+    inbound_shipped_quantity: float
+    inbound_received_quantity: float
+    reserved_quantity: float
+    total_quantity: float
+    clean_asin: str
+    clean_sku: str
+    fulfillment_center: str
+    condition_type: str
+    quantity: int
+    last_updated: str
+    clean_country: str
+
+
+@dataclass(slots=True)
+class SnapshotRow:
+    # one amazon_data.inventory_snapshot row
+    seller_sku: str
+    country: str
+    snapshot_timestamp: object
+    fulfillable_quantity: float
+    unfulfillable_quantity: float
+    inbound_working_quantity: float
+    inbound_shipped_quantity: float
+    inbound_received_quantity: float
+    reserved_quantity: float
+    total_quantity: float
+    asin: str
+
+
+@dataclass(slots=True)
+class InventoryRow:
+    # one amazon_data.amazon_inventory row, as transform_inventory builds it
+    asin: str
+    sku: str
+    fulfillment_center: str
+    condition_type: str
+    quantity: int
+    last_updated: str
+    country: str
+
+
+@dataclass(slots=True)
+class OrderRow:
+    # one amazon_orders row
+    amazon_order_id: str
+    order_status: str
+    purchase_date: str
+    buyer_email: str
+    order_total: float
+    currency_code: str
+
+
+@dataclass(slots=True)
+class ProductRow:
+    # one amazon_products row
+    asin: str
+    sku: str
+    product_title: str
+    price: float
+    currency_code: str
+    stock_quantity: int
+    last_updated: str
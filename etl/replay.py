@@ -0,0 +1,263 @@
+"""
+Offline SP-API backend for profiling the extractors without network access.
+
+The captured responses in amazon-fetched/ are replicated REPLAY_SCALE times
+(copies get distinct SKUs and order ids) and served page by page through
+clients with the same methods and ApiResponse objects as python-amazon-sp-api:
+
+    SPAPI_TRANSPORT=replay REPLAY_SCALE=200 REPLAY_LATENCY_MS=120 \\
+        REPLAY_THROTTLE_RATE=0.05 python -m etl.run_etl
+
+REPLAY_LATENCY_MS / REPLAY_JITTER_MS delay every call, REPLAY_THROTTLE_RATE
+is the share of calls answered with a 429, and REPLAY_MISSING_ASIN_RATE
+blanks that share of inventory ASINs so the Listings lookups get exercised.
+Listings are synthesized from the inventory summaries, since no
+getListingsItem responses were captured.
+"""
+
+import base64
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sp_api.base import ApiResponse
+from sp_api.base.exceptions import SellingApiNotFoundException, SellingApiRequestThrottledException
+
+SPAPI_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _encode_token(state):
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+
+def _decode_token(token):
+    return json.loads(base64.urlsafe_b64decode(token.encode()))
+
+
+class ReplayDataset:
+    """The captured fixtures, scaled up. Built once and shared by every
+    replay client; inventory and orders are rebuilt per marketplace so each
+    marketplace sees its own ids."""
+
+    def __init__(self, directory=None, scale=None, missing_asin_rate=None, seed=None):
+        self.directory = directory or os.getenv("REPLAY_DIR", "amazon-fetched")
+        self.scale = scale if scale is not None else int(os.getenv("REPLAY_SCALE", 1))
+        if missing_asin_rate is None:
+            missing_asin_rate = float(os.getenv("REPLAY_MISSING_ASIN_RATE", 0))
+        self.missing_asin_rate = missing_asin_rate
+        self.seed = seed if seed is not None else int(os.getenv("REPLAY_SEED", 0))
+        self._inventory = {}
+        self._orders = {}
+        self._listings = {}
+        self._lock = threading.Lock()
+
+    def _load(self, name):
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def inventory(self, marketplace_id):
+        with self._lock:
+            if marketplace_id not in self._inventory:
+                fixture = self._load("inventory.json") or {}
+                summaries = fixture.get("payload", {}).get("inventorySummaries", [])
+                rng = random.Random(f"{self.seed}-{marketplace_id}")
+                items = []
+                for copy in range(self.scale):
+                    for summary in summaries:
+                        item = dict(summary)
+                        if copy:
+                            item["sellerSku"] = f"{summary['sellerSku']}-R{copy}"
+                        if self.missing_asin_rate and rng.random() < self.missing_asin_rate:
+                            item.pop("asin", None)
+                        items.append(item)
+                self._inventory[marketplace_id] = items
+                # a listing for every SKU, keeping the ASIN the summary had
+                for item, summary in zip(items, summaries * self.scale):
+                    self._listings[(marketplace_id, item["sellerSku"])] = (summary, item["sellerSku"])
+            return self._inventory[marketplace_id]
+
+    def orders(self, marketplace_id):
+        with self._lock:
+            if marketplace_id not in self._orders:
+                fixture = self._load("orders.json") or {}
+                captured = fixture.get("payload", {}).get("Orders", [])
+                orders = []
+                for copy in range(self.scale):
+                    for order in captured:
+                        order = dict(order, MarketplaceId=marketplace_id)
+                        if copy or marketplace_id != captured[0].get("MarketplaceId"):
+                            order["AmazonOrderId"] = f"{order['AmazonOrderId']}-{marketplace_id[-4:]}{copy}"
+                        orders.append(order)
+                orders.sort(key=lambda order: order.get("LastUpdateDate", ""))
+                self._orders[marketplace_id] = orders
+            return self._orders[marketplace_id]
+
+    def listing(self, marketplace_id, sku):
+        self.inventory(marketplace_id)
+        return self._listings.get((marketplace_id, sku))
+
+
+class ReplayBackend:
+    """Simulated network: latency, jitter and injected 429s."""
+
+    def __init__(self, latency_ms=None, jitter_ms=None, throttle_rate=None, seed=None):
+        if latency_ms is None:
+            latency_ms = float(os.getenv("REPLAY_LATENCY_MS", 0))
+        if jitter_ms is None:
+            jitter_ms = float(os.getenv("REPLAY_JITTER_MS", 0))
+        if throttle_rate is None:
+            throttle_rate = float(os.getenv("REPLAY_THROTTLE_RATE", 0))
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.throttle_rate = throttle_rate
+        self._rng = random.Random(seed if seed is not None else int(os.getenv("REPLAY_SEED", 0)))
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.throttled = 0
+
+    def call(self, operation):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0)
+            throttle = self.throttle_rate and self._rng.random() < self.throttle_rate
+            if throttle:
+                self.throttled += 1
+        if delay:
+            time.sleep(delay)
+        if throttle:
+            raise SellingApiRequestThrottledException([{
+                "code": "QuotaExceeded",
+                "message": f"You exceeded your quota for the requested resource ({operation}).",
+            }], {})
+
+
+_dataset = None
+_backend = None
+_shared_lock = threading.Lock()
+
+
+def get_dataset():
+    global _dataset
+    with _shared_lock:
+        if _dataset is None:
+            _dataset = ReplayDataset()
+        return _dataset
+
+
+def get_backend():
+    global _backend
+    with _shared_lock:
+        if _backend is None:
+            _backend = ReplayBackend()
+        return _backend
+
+
+def reset_replay(dataset=None, backend=None):
+    """Swap in a new dataset/backend, e.g. between benchmark scales."""
+    global _dataset, _backend
+    with _shared_lock:
+        _dataset = dataset
+        _backend = backend
+
+
+class ReplayClient:
+    def __init__(self, marketplace=None, **kwargs):
+        self.marketplace = marketplace
+        self.marketplace_id = marketplace.marketplace_id if marketplace is not None else None
+
+
+class ReplayInventories(ReplayClient):
+    def get_inventory_summary_marketplace(self, details=False, marketplaceIds=None, nextToken=None,
+                                          maxResultsPerPage=50, **kwargs):
+        get_backend().call("getInventorySummaries")
+        marketplace_id = (marketplaceIds or [self.marketplace_id])[0]
+        items = get_dataset().inventory(marketplace_id)
+        start = _decode_token(nextToken)["offset"] if nextToken else 0
+        end = start + int(maxResultsPerPage)
+        page = []
+        for item in items[start:end]:
+            item = dict(item)
+            if not details:
+                item.pop("inventoryDetails", None)
+            page.append(item)
+        pagination = {"nextToken": _encode_token({"offset": end})} if end < len(items) else None
+        return ApiResponse(
+            payload={
+                "granularity": {"granularityType": "Marketplace", "granularityId": marketplace_id},
+                "inventorySummaries": page,
+            },
+            pagination=pagination,
+        )
+
+
+class ReplayOrders(ReplayClient):
+    def get_orders(self, MarketplaceIds=None, NextToken=None, LastUpdatedAfter=None, CreatedAfter=None,
+                   MaxResultsPerPage=100, **kwargs):
+        get_backend().call("getOrders")
+        if NextToken:
+            query = _decode_token(NextToken)
+        else:
+            # SP-API only serves data up to two minutes ago
+            before = (datetime.now(timezone.utc) - timedelta(minutes=2)).strftime(SPAPI_TIME_FORMAT)
+            if LastUpdatedAfter:
+                query = {"field": "LastUpdateDate", "after": LastUpdatedAfter, "before": before,
+                         "bound": "LastUpdatedBefore"}
+            else:
+                query = {"field": "PurchaseDate", "after": CreatedAfter or "1970-01-01T00:00:00Z",
+                         "before": before, "bound": "CreatedBefore"}
+            query["marketplace"] = (MarketplaceIds or [self.marketplace_id])[0]
+            query["offset"] = 0
+
+        after = _parse_time(query["after"])
+        matching = [
+            order for order in get_dataset().orders(query["marketplace"])
+            if order.get(query["field"]) and _parse_time(order[query["field"]]) > after
+        ]
+        start = query["offset"]
+        end = start + int(MaxResultsPerPage)
+        payload = {"Orders": matching[start:end], query["bound"]: query["before"]}
+        if end < len(matching):
+            payload["NextToken"] = _encode_token(dict(query, offset=end))
+        return ApiResponse(payload=payload)
+
+
+class ReplayListingsItems(ReplayClient):
+    def get_listings_item(self, sellerId, sku, marketplaceIds=None, includedData=None, **kwargs):
+        get_backend().call("getListingsItem")
+        marketplace_id = (marketplaceIds or [self.marketplace_id])[0]
+        found = get_dataset().listing(marketplace_id, sku)
+        if found is None:
+            raise SellingApiNotFoundException([{
+                "code": "NOT_FOUND",
+                "message": f"SKU '{sku}' not found in marketplace {marketplace_id}",
+            }], {})
+        summary, seller_sku = found
+        return ApiResponse(payload={
+            "sku": seller_sku,
+            "summaries": [{
+                "marketplaceId": marketplace_id,
+                "asin": summary.get("asin"),
+                "productType": "PRODUCT",
+                "conditionType": "new_new",
+                "status": ["BUYABLE", "DISCOVERABLE"],
+                "itemName": summary.get("productName"),
+                "createdDate": summary.get("lastUpdatedTime"),
+                "lastUpdatedDate": summary.get("lastUpdatedTime"),
+            }],
+            "attributes": {},
+            "issues": [],
+            "fulfillmentAvailability": [{
+                "fulfillmentChannelCode": "AMAZON_EU",
+                "quantity": summary.get("totalQuantity", 0),
+            }],
+        })
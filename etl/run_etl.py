@@ -1,18 +1,84 @@
-from etl.summary_inventory import summarize_inventory
-from etl.extract_inventory import run_daily_inventory_report
-from etl.transform_inventory import transform_inventory
-from etl.load_inventory import insert_inventory_to_db
-import etl.update_uom_with_asin
+# Pipeline stages are imported inside the functions below so that importing
+# this module (CLI start-up, tests, dry runs) stays cheap and has no side
+# effects; nothing touches the database or the UOM files until a stage runs.
 
+import functools
+
+def run_setup():
+    from etl.extract_inventory import ensure_snapshot_table
+    from etl.uom import sync_uom_from_excel
+    from etl.update_uom_with_asin import update_uom_with_asin
+
+    ensure_snapshot_table()
+    sync_uom_from_excel()
+    update_uom_with_asin()
+
+def instrumented(run_name):
+    # Times the whole run and writes the metrics report (METRICS_DIR, plus
+    # METRICS_PROMETHEUS_FILE if set) even when the run fails.
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            from etl import metrics
+
+            metrics.start_run(run_name)
+            status = "failed"
+            try:
+                with metrics.timer("run"):
+                    result = func(*args, **kwargs)
+                status = "ok"
+                return result
+            finally:
+                metrics.write_report(status)
+        return wrapper
+    return decorate
+
+@instrumented("inventory")
 def run_pipeline():
-    raw_inventory = run_daily_inventory_report()
-    if not raw_inventory:
-        print("⚠️ No data to process.")
-        return
+    from etl import metrics
+    from etl.checkpoint import InventoryCheckpoint
+    from etl.summary_inventory import summarize_inventory
+    from etl.extract_inventory import run_daily_inventory_report
+    from etl.fused import FusedInventoryStage
+
+    with metrics.timer("setup"):
+        run_setup()
+
+    # Each page is parsed once and loaded into inventory_snapshot and
+    # amazon_inventory as soon as it arrives; the summary is built from the
+    # records kept in memory instead of re-reading the snapshot.
+    # Every loaded page is checkpointed, so if the run fails part way, the
+    # next run carries on from there (etl.checkpoint). The run is finished
+    # when the summary resets the snapshot, so a failed summary is rebuilt
+    # from the snapshot by the next run.
+    checkpoint = InventoryCheckpoint.open()
+    stage = FusedInventoryStage()
+    with metrics.timer("inventory_report"):
+        run_daily_inventory_report(load_page=stage.load_page, collect=False, checkpoint=checkpoint)
+    checkpoint.extraction_done()
+
+    with metrics.timer("summarize_inventory"):
+        if checkpoint.resumed:
+            # pages loaded by the earlier attempt are only in the snapshot
+            summarize_inventory(checkpoint=checkpoint)
+        elif not stage.items:
+            print("⚠️ No data to process.")
+            checkpoint.finish()
+        else:
+            summarize_inventory(df_inventory=stage.summary_frame(), checkpoint=checkpoint)
+
+@instrumented("orders")
+def run_orders_pipeline():
+    from etl.extract_orders import fetch_orders, save_order_watermarks
+    from etl.transform_orders import transform_orders
+    from etl.load_orders import insert_orders_to_db
 
-    transformed = transform_inventory(raw_inventory)
-    insert_inventory_to_db(transformed)
-    summarize_inventory()
+    # Only orders changed since the last run are fetched; the watermarks are
+    # saved after the load so a failed load is retried next time.
+    orders, watermarks = fetch_orders()
+    if orders:
+        insert_orders_to_db(transform_orders(orders, as_records=True))
+    save_order_watermarks(watermarks)
 
 if __name__ == "__main__":
-    run_pipeline()
\ No newline at end of file
+    run_pipeline()
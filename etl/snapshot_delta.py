@@ -0,0 +1,141 @@
+"""
+Change-only snapshot writes (SNAPSHOT_WRITE_MODE=delta).
+
+amazon_data.inventory_state keeps one row per (seller_sku, country): a
+64-bit hash of the quantities and ASIN last written to inventory_snapshot,
+the total quantity, ASIN and snapshot_timestamp of that row, and
+last_seen_at, the batch timestamp of the latest run that reported the SKU.
+A row whose hash is unchanged is not written to the snapshot (and so not
+archived); only its last_seen_at moves, which is the "unchanged since
+snapshot_timestamp, still true at last_seen_at" marker.
+
+summarize_inventory reads the complete latest state from this table in
+delta mode: every SKU seen by the latest run, changed or not.
+
+The hashes are only meaningful while every run writes in delta mode; a
+full-mode run of run_daily_inventory_report drops the table so the next
+delta run starts over with every row. Other callers of write_snapshot_rows
+leave it alone.
+"""
+
+import hashlib
+
+from sqlalchemy import text
+
+from etl.db import get_postgres_engine
+from etl.records import as_integer, row_values
+
+QUANTITY_COLUMNS = [
+    "fulfillable_quantity", "unfulfillable_quantity", "inbound_working_quantity",
+    "inbound_shipped_quantity", "inbound_received_quantity", "reserved_quantity",
+    "total_quantity",
+]
+
+STATE_COLUMNS = ["seller_sku", "country", "total_quantity", "asin", "snapshot_timestamp"]
+
+# the rows summarize_inventory needs, for the run that was loaded last
+LATEST_STATE_SQL = """
+    SELECT seller_sku, country, total_quantity, snapshot_timestamp, asin
+    FROM amazon_data.inventory_state
+    WHERE last_seen_at = (SELECT max(last_seen_at) FROM amazon_data.inventory_state)
+"""
+
+def ensure_state_table(conn):
+    conn.execute(text("""
+        CREATE SCHEMA IF NOT EXISTS amazon_data;
+        CREATE TABLE IF NOT EXISTS amazon_data.inventory_state (
+            seller_sku          TEXT          NOT NULL,
+            country             TEXT          NOT NULL,
+            quantity_hash       BIGINT        NOT NULL,
+            total_quantity      INTEGER       NOT NULL,
+            asin                TEXT,
+            snapshot_timestamp  TIMESTAMPTZ   NOT NULL,
+            last_seen_at        TIMESTAMP     NOT NULL,
+            PRIMARY KEY (seller_sku, country)
+        );
+    """))
+
+
+def drop_state():
+    """Forget the hashes; called by full-mode inventory runs, which change
+    the snapshot without updating them."""
+    with get_postgres_engine().begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS amazon_data.inventory_state"))
+
+
+def quantity_hash(row):
+    values = [str(as_integer(value)) for value in row_values(row, QUANTITY_COLUMNS)]
+    values.append(row_values(row, ["asin"])[0] or "")
+    digest = hashlib.blake2b("|".join(values).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def split_changed(conn, rows, hashes):
+    """The rows whose hash differs from the stored one (or that are new),
+    and the (seller_sku, country) keys of the unchanged ones."""
+    keys = [row_values(row, ["seller_sku", "country"]) for row in rows]
+    unchanged = set(conn.execute(text("""
+        SELECT s.seller_sku, s.country
+        FROM unnest(CAST(:skus AS text[]), CAST(:countries AS text[]), CAST(:hashes AS bigint[]))
+            AS i(seller_sku, country, quantity_hash)
+        JOIN amazon_data.inventory_state s
+          ON s.seller_sku = i.seller_sku AND s.country = i.country AND s.quantity_hash = i.quantity_hash
+    """), {
+        "skus": [sku for sku, _ in keys],
+        "countries": [country for _, country in keys],
+        "hashes": hashes,
+    }).tuples().all())
+    changed = [(row, row_hash) for row, key, row_hash in zip(rows, keys, hashes) if key not in unchanged]
+    return changed, unchanged
+
+
+def record_state(conn, changed, unchanged, batch_ts):
+    if changed:
+        params = []
+        for row, row_hash in changed:
+            values = dict(zip(STATE_COLUMNS, row_values(row, STATE_COLUMNS)))
+            values.update(
+                quantity_hash=row_hash,
+                total_quantity=as_integer(values["total_quantity"]),
+                last_seen_at=batch_ts,
+            )
+            params.append(values)
+        conn.execute(text("""
+            INSERT INTO amazon_data.inventory_state
+                (seller_sku, country, quantity_hash, total_quantity, asin, snapshot_timestamp, last_seen_at)
+            VALUES (:seller_sku, :country, :quantity_hash, :total_quantity, :asin, :snapshot_timestamp, :last_seen_at)
+            ON CONFLICT (seller_sku, country) DO UPDATE SET
+                quantity_hash = EXCLUDED.quantity_hash,
+                total_quantity = EXCLUDED.total_quantity,
+                asin = EXCLUDED.asin,
+                snapshot_timestamp = EXCLUDED.snapshot_timestamp,
+                last_seen_at = EXCLUDED.last_seen_at
+        """), params)
+    if unchanged:
+        conn.execute(text("""
+            UPDATE amazon_data.inventory_state s SET last_seen_at = :last_seen_at
+            FROM unnest(CAST(:skus AS text[]), CAST(:countries AS text[])) AS u(seller_sku, country)
+            WHERE s.seller_sku = u.seller_sku AND s.country = u.country
+        """), {
+            "skus": [sku for sku, _ in unchanged],
+            "countries": [country for _, country in unchanged],
+            "last_seen_at": batch_ts,
+        })
+
+
+def write_changed_rows(rows, batch_ts, write):
+    """Pass only the changed rows to write(rows), then record the new
+    hashes. Returns (written, unchanged) counts.
+
+    The state is updated after the snapshot write, so a failure in between
+    only means those rows are written again next time."""
+    if not rows:
+        return 0, 0
+    hashes = [quantity_hash(row) for row in rows]
+    with get_postgres_engine().begin() as conn:
+        ensure_state_table(conn)
+        changed, unchanged = split_changed(conn, rows, hashes)
+    write([row for row, _ in changed])
+    with get_postgres_engine().begin() as conn:
+        record_state(conn, changed, unchanged, batch_ts)
+    return len(changed), len(rows) - len(changed)
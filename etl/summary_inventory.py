@@ -1,55 +1,39 @@
+import io
 import os
 from datetime import date
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from dotenv import load_dotenv
 
+from etl import metrics
+from etl.archive import archive_snapshot
+from etl.db import get_postgres_engine
+from etl.export_summary import export_summary
+from etl.update_uom_with_asin import build_uom_with_asin
+
 load_dotenv()
 
-POSTGRES_HOST = os.getenv("POSTGRES_HOST")
-POSTGRES_PORT = os.getenv("POSTGRES_PORT")
-POSTGRES_USER = os.getenv("POSTGRES_USER")
-POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
-POSTGRES_DB = os.getenv("POSTGRES_DB")
-
-engine = create_engine(
-    f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
-)
-
-def summarize_inventory(uom_file="assets/clean_uom_with_asin.csv"):
-    # STEP 1: Load existing snapshot into pandas before archiving
-    df_inventory = pd.read_sql(
-        "SELECT * FROM amazon_data.inventory_snapshot",
-        con=engine
+def load_uom_file(uom_file):
+    # Load cleaned UOM data from CSV
+    df_uom = pd.read_csv(uom_file)
+    df_uom.columns = [col.strip().lower() for col in df_uom.columns]
+    df_uom = df_uom[["asin", "seller_sku", "uom", "product_name"]]
+    # Normalize ASIN and SKU
+    df_uom["seller_sku"] = (
+        df_uom["seller_sku"]
+        .astype(str)
+        .str.strip()
+        .str.upper()
+        .str.strip('"')
     )
+    df_uom["asin"] = df_uom["asin"].astype(str).str.strip().str.strip('"')
+    return df_uom
+
+
+def summarize_frame(df_inventory, df_uom):
     # Ensure `asin` column exists even if inventory_snapshot lacks it
     if 'asin' not in df_inventory.columns:
         df_inventory['asin'] = None
-    # Archive yesterday's snapshot, then reset staging
-    with engine.begin() as conn:
-        # Ensure archive table exists and has a snapshot_date column
-        conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS amazon_data.inventory_snapshot_archive
-            (LIKE amazon_data.inventory_snapshot INCLUDING ALL);
-        """))
-        conn.execute(text("""
-            ALTER TABLE amazon_data.inventory_snapshot_archive
-            ADD COLUMN IF NOT EXISTS snapshot_date date;
-        """))
-        conn.execute(text("""
-            ALTER TABLE amazon_data.inventory_snapshot
-            ADD COLUMN IF NOT EXISTS asin TEXT;
-        """))
-        # Copy current snapshot into archive with a date partition
-        conn.execute(text("""
-            INSERT INTO amazon_data.inventory_snapshot_archive
-            SELECT *, snapshot_timestamp::date as snapshot_date
-            FROM amazon_data.inventory_snapshot
-            ON CONFLICT (seller_sku, country, snapshot_timestamp) DO NOTHING;
-        """))
-        # Reset staging tables for fresh load
-        conn.execute(text("TRUNCATE TABLE amazon_data.inventory_snapshot CASCADE"))
-        conn.execute(text("DROP TABLE IF EXISTS amazon_data.inventory_summary"))
     # --- START DATA CLEANING BLOCK ---
     # 1) Drop exact duplicates
     df_inventory = df_inventory.drop_duplicates(
@@ -69,20 +53,6 @@ def summarize_inventory(uom_file="assets/clean_uom_with_asin.csv"):
     df_inventory['snapshot_timestamp'] = pd.to_datetime(df_inventory['snapshot_timestamp'])
     df_latest = df_inventory.sort_values("snapshot_timestamp").drop_duplicates(subset=["seller_sku", "country"], keep="last")
 
-    # Load cleaned UOM data from CSV
-    df_uom = pd.read_csv(uom_file)
-    df_uom.columns = [col.strip().lower() for col in df_uom.columns]
-    df_uom = df_uom[["asin", "seller_sku", "uom", "product_name"]]
-    # Normalize ASIN and SKU
-    df_uom["seller_sku"] = (
-        df_uom["seller_sku"]
-        .astype(str)
-        .str.strip()
-        .str.upper()
-        .str.strip('"')
-    )
-    df_uom["asin"] = df_uom["asin"].astype(str).str.strip().str.strip('"')
-
     # Join with inventory
     df_merged = pd.merge(df_latest, df_uom, on="seller_sku", how="left")
     # Ensure we have a single `asin` column after the merge
@@ -127,28 +97,154 @@ def summarize_inventory(uom_file="assets/clean_uom_with_asin.csv"):
         .sort_values(["country", "asin"])
     )
 
+    return summary
+
+
+def snapshot_source(conn):
+    # In delta mode (SNAPSHOT_WRITE_MODE) the snapshot only holds the rows
+    # that changed; the complete latest state is in inventory_state.
+    if os.getenv("SNAPSHOT_WRITE_MODE", "full") == "delta":
+        from etl.snapshot_delta import LATEST_STATE_SQL, ensure_state_table
+        ensure_state_table(conn)
+        return f"({LATEST_STATE_SQL}) latest_state"
+    return "amazon_data.inventory_snapshot"
+
+
+def summarize_in_sql(conn, df_uom, source="amazon_data.inventory_snapshot"):
+    """Same result as summarize_frame, computed inside Postgres.
+
+    The latest row per (normalized SKU, country), the UOM join and the
+    grouping all run in one query; only the summary rows come back. The UOM
+    CSV is small, so it is shipped into a temp table for the join."""
+    conn.execute(text("""
+        CREATE TEMP TABLE summary_uom (
+            asin          TEXT,
+            seller_sku    TEXT,
+            uom           DOUBLE PRECISION,
+            product_name  TEXT
+        ) ON COMMIT DROP
+    """))
+    uom_records = df_uom.astype(object).where(df_uom.notna(), None).to_dict(orient="records")
+    if uom_records:
+        conn.execute(text("""
+            INSERT INTO summary_uom (asin, seller_sku, uom, product_name)
+            VALUES (:asin, :seller_sku, :uom, :product_name)
+        """), uom_records)
+    # Mirrors the pandas steps: SKUs are trimmed/upper-cased before picking
+    # the latest row; SKUs whose merged ASIN is NULL also get the default
+    # ('', '(unknown)', uom 1) row; rows with a NULL group key are dropped
+    # like groupby does; ordering uses the C collation like Python sorting.
+    return pd.read_sql(text(f"""
+        WITH latest AS (
+            SELECT DISTINCT ON (sku, country) sku, country, total_quantity
+            FROM (
+                SELECT upper(btrim(seller_sku, E' \\t\\n\\r\\f\\x0B')) AS sku,
+                       country, total_quantity, snapshot_timestamp
+                FROM {source}
+            ) s
+            ORDER BY sku, country, snapshot_timestamp DESC
+        ),
+        joined AS (
+            SELECT l.sku, l.country, l.total_quantity, u.asin, u.product_name, u.uom
+            FROM latest l
+            LEFT JOIN summary_uom u ON u.seller_sku = l.sku
+        ),
+        missing AS (
+            SELECT DISTINCT sku FROM joined WHERE asin IS NULL
+        ),
+        summary_rows AS (
+            SELECT country, asin, product_name,
+                   total_quantity * COALESCE(uom, 1) AS quantity_on_hand
+            FROM joined
+            UNION ALL
+            SELECT l.country, '', '(unknown)',
+                   l.total_quantity::double precision
+            FROM latest l
+            JOIN missing m ON m.sku = l.sku
+        )
+        SELECT country, asin, product_name, SUM(quantity_on_hand) AS quantity_on_hand
+        FROM summary_rows
+        WHERE country IS NOT NULL AND asin IS NOT NULL AND product_name IS NOT NULL
+        GROUP BY country, asin, product_name
+        ORDER BY country COLLATE "C", asin COLLATE "C", product_name COLLATE "C"
+    """), conn)
+
+
+def current_uom_with_asin(conn, uom_path="assets/clean_uom.csv"):
+    # Same frame as load_uom_file("assets/clean_uom_with_asin.csv"), but with
+    # the ASINs taken from latest_sku_asin as of this transaction; the CSV
+    # round trip keeps the dtypes identical to the file-based path.
+    buffer = io.StringIO()
+    build_uom_with_asin(conn, uom_path).to_csv(buffer, index=False)
+    buffer.seek(0)
+    return load_uom_file(buffer)
+
+
+def summarize_inventory(uom_file=None, mode=None, df_inventory=None, checkpoint=None):
+    # SUMMARY_ENGINE: "pandas" pulls the snapshot into Python, "sql" pushes
+    # the aggregation into Postgres and only fetches the summary rows.
+    # A df_inventory already held in memory (see etl.fused) is summarized
+    # as is, without reading the snapshot back.
+    # The snapshot is only truncated once the summary has been published,
+    # together with checkpoint.finish() when a checkpoint is given.
+    if df_inventory is not None:
+        mode = "memory"
+    elif mode is None:
+        mode = os.getenv("SUMMARY_ENGINE", "pandas")
+    engine = get_postgres_engine()
+    df_uom = load_uom_file(uom_file) if uom_file else None
+
+    # Archive the snapshot; staging is reset once the summary is published
+    with engine.begin() as conn:
+        conn.execute(text("""
+            ALTER TABLE amazon_data.inventory_snapshot
+            ADD COLUMN IF NOT EXISTS asin TEXT;
+        """))
+        # never replace the summary and exports with an empty one
+        if mode != "memory" and not conn.execute(
+                text(f"SELECT EXISTS (SELECT 1 FROM {snapshot_source(conn)})")).scalar():
+            print("⚠️ inventory_snapshot is empty; keeping the current summary.")
+            return
+        # Copy current snapshot into its monthly archive partition; this also
+        # brings latest_sku_asin and the daily rollup up to date
+        with metrics.timer("summary", step="archive"):
+            archive_snapshot(conn, snapshot_source(conn))
+        if df_uom is None:
+            with metrics.timer("summary", step="uom"):
+                df_uom = current_uom_with_asin(conn)
+        # STEP 1: Read the snapshot (or summarize it in place) before truncating
+        if mode == "sql":
+            with metrics.timer("summary", step="sql"):
+                summary = summarize_in_sql(conn, df_uom, snapshot_source(conn))
+        elif mode != "memory":
+            with metrics.timer("summary", step="read"):
+                df_inventory = pd.read_sql(
+                    text(f"SELECT * FROM {snapshot_source(conn)}"),
+                    con=conn
+                )
+
+    if mode != "sql":
+        with metrics.timer("summary", step="frame"):
+            summary = summarize_frame(df_inventory, df_uom)
+    metrics.count("rows", len(summary), stage="inventory_summary")
+
     print("✅ Inventory summary by country, ASIN, and product name:")
     print(summary)
 
-    # Save summary to PostgreSQL table
-    # Ensure schema exists
-    with engine.begin() as conn:
-        conn.execute(text("CREATE SCHEMA IF NOT EXISTS amazon_data;"))
-    # Write summary table, replacing any existing
-    summary.to_sql(
-        "inventory_summary",
-        con=engine,
-        schema="amazon_data",
-        index=False,
-        if_exists="replace"
-    )
+    # Swap the summary table (COPY into a shadow table) and write the
+    # CSV and Parquet exports
+    today = date.today()
+    paths = export_summary(summary, today, engine=engine)
 
-    # Save summary to CSV
-    today_str = date.today().isoformat()
-    os.makedirs("exports", exist_ok=True)
-    summary.to_csv(f"exports/inventory_summary_{today_str}.csv", index=False)
+    print(f"\n✅ Saved summary to DB table 'amazon_data.inventory_summary' and {', '.join(paths)} for {today}")
 
-    print(f"\n✅ Saved summary to DB table 'amazon_data.inventory_summary' and CSV file for {today_str}")
+    # Reset staging for the next load; until here a rerun can still build
+    # the summary from it. Archiving again on a rerun is a no-op.
+    with engine.begin() as conn:
+        with metrics.timer("summary", step="truncate"):
+            conn.execute(text("TRUNCATE TABLE amazon_data.inventory_snapshot CASCADE"))
+        if checkpoint:
+            checkpoint.finish(conn)
 
 if __name__ == "__main__":
     summarize_inventory()
\ No newline at end of file
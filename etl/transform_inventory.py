@@ -1,4 +1,11 @@
-def transform_inventory(raw_inventory):
+from etl import metrics
+from etl.records import InventoryRow
+
+
+@metrics.timer("transform", stage="inventory")
+def transform_inventory(raw_inventory, as_records=False):
+    # InventoryRow(...) and dict(...) take the same keywords
+    make_row = InventoryRow if as_records else dict
     transformed = []
 
     for item in raw_inventory:
@@ -35,14 +42,14 @@ def transform_inventory(raw_inventory):
         else:
             country = 'N/A'
 
-        transformed.append({
-            'asin': asin,
-            'sku': sku,
-            'fulfillment_center': fulfillment_center,
-            'condition_type': condition_type,
-            'quantity': quantity,
-            'last_updated': clean_time,
-            'country': country
-        })
+        transformed.append(make_row(
+            asin=asin,
+            sku=sku,
+            fulfillment_center=fulfillment_center,
+            condition_type=condition_type,
+            quantity=quantity,
+            last_updated=clean_time,
+            country=country
+        ))
 
     return transformed
\ No newline at end of file
@@ -1,4 +1,11 @@
-def transform_orders(raw_orders):
+from etl import metrics
+from etl.records import OrderRow
+
+
+@metrics.timer("transform", stage="orders")
+def transform_orders(raw_orders, as_records=False):
+    # OrderRow(...) and dict(...) take the same keywords
+    make_row = OrderRow if as_records else dict
     transformed = []
 
     for order in raw_orders:
@@ -11,13 +18,13 @@ def transform_orders(raw_orders):
         #     'order_total': float(order['OrderTotal']['Amount']),
         #     'currency_code': order['OrderTotal']['CurrencyCode']
         # }
-        transformed.append({
-            'amazon_order_id': order['AmazonOrderId'],
-            'order_status': order['OrderStatus'],
-            'purchase_date': order['PurchaseDate'],
-            'buyer_email': order.get('BuyerEmail', 'unknown@example.com'),
-            'order_total': float(order.get('OrderTotal', {}).get('Amount', 0.0)),
-            'currency_code': order.get('OrderTotal', {}).get('CurrencyCode', 'USD')
-        })
+        transformed.append(make_row(
+            amazon_order_id=order['AmazonOrderId'],
+            order_status=order['OrderStatus'],
+            purchase_date=order['PurchaseDate'],
+            buyer_email=order.get('BuyerEmail', 'unknown@example.com'),
+            order_total=float(order.get('OrderTotal', {}).get('Amount', 0.0)),
+            currency_code=order.get('OrderTotal', {}).get('CurrencyCode', 'USD')
+        ))
 
     return transformed
\ No newline at end of file
@@ -1,4 +1,11 @@
-def transform_products(raw_products):
+from etl import metrics
+from etl.records import ProductRow
+
+
+@metrics.timer("transform", stage="products")
+def transform_products(raw_products, as_records=False):
+    # ProductRow(...) and dict(...) take the same keywords
+    make_row = ProductRow if as_records else dict
     transformed = []
 
     for product in raw_products:
@@ -15,14 +22,14 @@ def transform_products(raw_products):
         raw_time = product.get('last_updated')
         clean_time = raw_time.replace("T", " ").replace("Z", "") if raw_time else None
 
-        transformed.append({
-            'asin': product['asin'],
-            'sku': product['sku'],
-            'product_title': product['product_title'],
-            'price': float(product['price']),
-            'currency_code': product.get('currency_code', 'USD'),
-            'stock_quantity': int(product.get('stock_quantity', 0)),
-            'last_updated': clean_time
-        })
+        transformed.append(make_row(
+            asin=product['asin'],
+            sku=product['sku'],
+            product_title=product['product_title'],
+            price=float(product['price']),
+            currency_code=product.get('currency_code', 'USD'),
+            stock_quantity=int(product.get('stock_quantity', 0)),
+            last_updated=clean_time
+        ))
 
     return transformed
\ No newline at end of file
@@ -0,0 +1,46 @@
+"""
+Where SP-API calls go. With SPAPI_TRANSPORT=live (the default) the
+extractors get the real python-amazon-sp-api clients; with
+SPAPI_TRANSPORT=replay they get the offline clients from etl.replay, which
+serve the captured responses in amazon-fetched/ without network access or
+credentials.
+"""
+
+import os
+
+from etl.credentials import get_spapi_credentials
+
+
+def is_replay():
+    return os.getenv("SPAPI_TRANSPORT", "live") == "replay"
+
+
+def session_key():
+    """Changes whenever cached clients have to be rebuilt (new STS session)."""
+    if is_replay():
+        return None
+    return get_spapi_credentials().get("session_token")
+
+
+def inventories_client(marketplace):
+    if is_replay():
+        from etl.replay import ReplayInventories
+        return ReplayInventories(marketplace=marketplace)
+    from sp_api.api import Inventories
+    return Inventories(marketplace=marketplace, credentials=get_spapi_credentials())
+
+
+def orders_client(marketplace):
+    if is_replay():
+        from etl.replay import ReplayOrders
+        return ReplayOrders(marketplace=marketplace)
+    from sp_api.api import Orders
+    return Orders(marketplace=marketplace, credentials=get_spapi_credentials())
+
+
+def listings_client(marketplace):
+    if is_replay():
+        from etl.replay import ReplayListingsItems
+        return ReplayListingsItems(marketplace=marketplace)
+    from sp_api.api import ListingsItems
+    return ListingsItems(marketplace=marketplace, credentials=get_spapi_credentials())
@@ -0,0 +1,211 @@
+"""
+Unit-of-measure factors. sync_uom_from_excel() keeps amazon_data.product_uom
+in step with Produktliste.xlsx; get_uom_map() reads the table into memory
+once per process for the snapshot normalization.
+
+The fingerprint of the workbook last synced is kept in amazon_data.uom_sync,
+written in the same transaction as product_uom, so unchanged runs skip Excel
+only when the database they write to really has that workbook. The parsed
+frame is cached under ETL_CACHE_DIR for diffing the next change.
+"""
+
+import hashlib
+import json
+import os
+
+import pandas as pd
+from sqlalchemy import text
+
+from etl.db import get_postgres_engine
+
+# Keys are (asin, seller_sku); loaded on first use
+UOM_MAP = None
+
+
+UOM_KEY = ['master_sku', 'seller_sku']
+
+
+def _cache_paths():
+    cache_dir = os.getenv('ETL_CACHE_DIR', '.cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    return (
+        os.path.join(cache_dir, 'uom_fingerprint.json'),
+        os.path.join(cache_dir, 'uom_frame.pkl'),
+    )
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_fingerprint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def ensure_uom_sync_table(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS amazon_data.uom_sync (
+            table_name  TEXT          PRIMARY KEY,
+            path        TEXT          NOT NULL,
+            sheet       TEXT,
+            mtime_ns    BIGINT        NOT NULL,
+            size        BIGINT        NOT NULL,
+            sha256      TEXT          NOT NULL,
+            synced_at   TIMESTAMPTZ   NOT NULL DEFAULT now()
+        )
+    """))
+
+
+def _synced_fingerprint(conn):
+    """The fingerprint of the workbook product_uom was last synced from,
+    or None if there is none or the table has been emptied since."""
+    ensure_uom_sync_table(conn)
+    row = conn.execute(text("""
+        SELECT path, sheet, mtime_ns, size, sha256 FROM amazon_data.uom_sync
+        WHERE table_name = 'product_uom'
+    """)).mappings().first()
+    if row is None or not conn.execute(text("SELECT EXISTS (SELECT 1 FROM amazon_data.product_uom)")).scalar():
+        return None
+    return dict(row)
+
+
+def _record_fingerprint(conn, fingerprint):
+    conn.execute(text("""
+        INSERT INTO amazon_data.uom_sync (table_name, path, sheet, mtime_ns, size, sha256)
+        VALUES ('product_uom', :path, :sheet, :mtime_ns, :size, :sha256)
+        ON CONFLICT (table_name) DO UPDATE SET
+            path = EXCLUDED.path,
+            sheet = EXCLUDED.sheet,
+            mtime_ns = EXCLUDED.mtime_ns,
+            size = EXCLUDED.size,
+            sha256 = EXCLUDED.sha256,
+            synced_at = now()
+    """), fingerprint)
+
+
+def parse_uom_workbook(excel_path, sheet_name=None):
+    # Inspect available sheets
+    xls = pd.ExcelFile(excel_path)
+    print("Available sheets in UOM file:", xls.sheet_names)
+    # Choose the correct sheet (replace 'YourSheetName' with the actual name)
+    sheet_name = sheet_name or xls.sheet_names[0]
+    df_uom = pd.read_excel(xls, sheet_name=sheet_name)
+    # Clean up headers and drop blank rows
+    df_uom.columns = df_uom.columns.str.strip()
+    # ensure asin column exists even if missing from CSV
+    if "asin" not in df_uom.columns:
+        df_uom["asin"] = None
+    df_uom = df_uom.rename(columns={'ASIN': 'master_sku', 'SKU': 'seller_sku', 'Einheiten': 'uom_factor'})
+    df_uom = df_uom[['master_sku', 'seller_sku', 'uom_factor']].dropna(subset=['master_sku', 'seller_sku'])
+    df_uom['uom_factor'] = pd.to_numeric(df_uom['uom_factor'], errors='coerce').fillna(1)
+    # later rows win, same as the row-wise upsert
+    return df_uom.drop_duplicates(subset=UOM_KEY, keep='last').reset_index(drop=True)
+
+
+def diff_uom_frames(previous, current):
+    """Return (upserts, deletes) as record lists turning previous into current."""
+    merged = previous.merge(current, on=UOM_KEY, how='outer', suffixes=('_old', ''), indicator=True)
+    changed = (merged['_merge'] == 'right_only') | (
+        (merged['_merge'] == 'both') & (merged['uom_factor'] != merged['uom_factor_old'])
+    )
+    upserts = merged.loc[changed, UOM_KEY + ['uom_factor']].to_dict(orient='records')
+    deletes = merged.loc[merged['_merge'] == 'left_only', UOM_KEY].to_dict(orient='records')
+    return upserts, deletes
+
+
+# --- Load UOM factors from Excel into product_uom table ---
+def sync_uom_from_excel(excel_path=None, sheet_name=None, force=False):
+    """Sync product_uom with the workbook, touching only what changed.
+
+    The workbook is fingerprinted by mtime/size and SHA-256 and compared
+    with the fingerprint stored in amazon_data.uom_sync. If product_uom
+    already holds this workbook, nothing is parsed or written. Otherwise the
+    new sheet is diffed against the cached frame of the synced workbook, if
+    this host has it, and only added/changed rows are upserted and removed
+    rows deleted."""
+    global UOM_MAP
+    excel_path = excel_path or os.getenv('UOM_EXCEL_PATH', 'assets/Produktliste.xlsx')
+    sheet_name = sheet_name or os.getenv('UOM_SHEET_NAME')
+    fingerprint_path, frame_path = _cache_paths()
+
+    stat = os.stat(excel_path)
+    fingerprint = {
+        'path': os.path.abspath(excel_path),
+        'sheet': sheet_name,
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+    }
+    with get_postgres_engine().begin() as conn:
+        previous = None if force else _synced_fingerprint(conn)
+    if previous is not None and all(previous[key] == fingerprint[key] for key in fingerprint):
+        print("✅ UOM workbook unchanged, skipping sync")
+        return
+
+    fingerprint['sha256'] = _file_sha256(excel_path)
+    if previous is not None and previous['sheet'] == sheet_name and previous['sha256'] == fingerprint['sha256']:
+        # touched, copied or moved but not edited: remember it and skip
+        with get_postgres_engine().begin() as conn:
+            _record_fingerprint(conn, fingerprint)
+        print("✅ UOM workbook content unchanged, skipping sync")
+        return
+
+    df_uom = parse_uom_workbook(excel_path, sheet_name)
+    # the cached frame is only a valid base if it is what the DB holds
+    cached = _read_fingerprint(fingerprint_path)
+    if previous is not None and cached is not None and os.path.exists(frame_path) \
+            and cached.get('sheet') == previous['sheet'] and cached.get('sha256') == previous['sha256']:
+        upserts, deletes = diff_uom_frames(pd.read_pickle(frame_path), df_uom)
+    else:
+        # no usable cache: upsert everything, as a full sync always did
+        upserts, deletes = df_uom.to_dict(orient='records'), []
+
+    with get_postgres_engine().begin() as conn:
+        if upserts:
+            conn.execute(text("""
+                INSERT INTO amazon_data.product_uom (master_sku, seller_sku, uom_factor)
+                VALUES (:master_sku, :seller_sku, :uom_factor)
+                ON CONFLICT (master_sku, seller_sku) DO UPDATE SET
+                  uom_factor = EXCLUDED.uom_factor
+            """), upserts)
+        if deletes:
+            conn.execute(text("""
+                DELETE FROM amazon_data.product_uom
+                WHERE master_sku = :master_sku AND seller_sku = :seller_sku
+            """), deletes)
+        _record_fingerprint(conn, fingerprint)
+
+    df_uom.to_pickle(frame_path)
+    with open(fingerprint_path, 'w') as f:
+        json.dump(fingerprint, f)
+    print(f"✅ UOM sync: {len(upserts)} rows upserted, {len(deletes)} removed")
+    if upserts or deletes:
+        # factors changed; reload on next use
+        UOM_MAP = None
+
+
+# Load UOM factors into memory: keys are (asin, seller_sku)
+def load_uom_map():
+    global UOM_MAP
+    with get_postgres_engine().connect() as conn:
+        result = conn.execute(text(
+            "SELECT master_sku, seller_sku, uom_factor FROM amazon_data.product_uom"
+        )).mappings().all()
+    UOM_MAP = {
+        (row['master_sku'], row['seller_sku']): row['uom_factor']
+        for row in result
+    }
+    return UOM_MAP
+
+
+def get_uom_map():
+    if UOM_MAP is None:
+        return load_uom_map()
+    return UOM_MAP